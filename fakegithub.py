@@ -0,0 +1,744 @@
+'''
+Local stand-in for the parts of the Github REST API tratihubis uses.
+
+It serves users, repositories, issues, comments, labels, milestones, issue imports and the rate limit from
+memory so migrations can be tested and benchmarked without network access or Github credentials. Every
+request is recorded, and responses can be delayed, limited by a per token quota and replaced by injected
+errors.
+
+To use it from Python::
+
+  import fakegithub
+  import github
+
+  with fakegithub.FakeGithub() as fake:
+      fake.addRepo('roskakori', 'tratihubis')
+      hub = github.Github('roskakori', base_url=fake.url)
+      ...
+
+It is not installed with tratihubis and only is available from a source checkout or the source
+distribution. To run it as server and point tratihubis at it using the config option ``base_url``::
+
+  $ python fakegithub.py --port 8765 roskakori/tratihubis
+
+Any token is accepted and used as login of the authenticated user unless specific users are passed to
+`FakeGithub`.
+'''
+# Copyright (c) 2012-2013, Thomas Aglassinger
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of Thomas Aglassinger nor the names of its contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+import BaseHTTPServer
+import collections
+import json
+import logging
+import optparse
+import re
+import socket
+import SocketServer
+import sys
+import threading
+import time
+import urllib
+import urlparse
+
+_log = logging.getLogger('fakegithub')
+
+#: Labels of a new Github repository.
+DEFAULT_LABEL_NAMES = ['bug', 'duplicate', 'enhancement', 'invalid', 'question', 'wontfix']
+
+_DEFAULT_LABEL_COLOR = 'ededed'
+_MAX_PER_PAGE = 100
+#: Seconds between checks whether the server should stop.
+_POLL_INTERVAL = 0.02
+_TIMESTAMP = '2012-05-01T00:00:00Z'
+
+#: A request received by `FakeGithub`. ``parameters`` are the query parameters and ``data`` is the decoded
+#: JSON body or ``None``.
+FakeRequest = collections.namedtuple('FakeRequest', ['method', 'path', 'parameters', 'token', 'data'])
+
+
+def _isoNow():
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+
+class _Failure(object):
+    def __init__(self, count, status, message, method, pathPattern, headers):
+        self.count = count
+        self.status = status
+        self.message = message
+        self.method = method
+        self.pathRegex = re.compile(pathPattern) if pathPattern is not None else None
+        self.headers = headers
+
+    def matches(self, method, path):
+        return (self.count > 0) \
+            and ((self.method is None) or (self.method == method)) \
+            and ((self.pathRegex is None) or (self.pathRegex.search(path) is not None))
+
+
+class _FakeError(Exception):
+    def __init__(self, status, message, headers=None):
+        super(_FakeError, self).__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class FakeRepo(object):
+    '''
+    Issues, labels, milestones and issue imports of a repository served by `FakeGithub`.
+    '''
+    def __init__(self, ownerLogin, name, labelNames=DEFAULT_LABEL_NAMES):
+        self.ownerLogin = ownerLogin
+        self.name = name
+        self.issues = []
+        self.comments = {}
+        self.imports = []
+        #: Number of the next imports Github rejects regardless of their data.
+        self.importFailureCount = 0
+        #: Logins with push access; with ``None`` every user has it. Like Github, labels, milestone and
+        #: assignee of issues created by other users are ignored.
+        self.pushLogins = None
+        self.labels = collections.OrderedDict(
+            (labelName, {'name': labelName, 'color': _DEFAULT_LABEL_COLOR}) for labelName in labelNames)
+        self.milestones = []
+
+    @property
+    def fullName(self):
+        return u'%s/%s' % (self.ownerLogin, self.name)
+
+    def addIssue(self, title, body=u'', state='open', author=None, createdAt=None):
+        '''
+        Add an issue directly, for example to simulate issues that existed before the migration. Without
+        ``createdAt``, the issue is created now.
+        '''
+        issue = {
+            'number': len(self.issues) + 1,
+            'title': title,
+            'body': body,
+            'state': state,
+            'labels': [],
+            'milestone': None,
+            'assignee': None,
+            'user': author if author is not None else self.ownerLogin,
+            'created_at': createdAt if createdAt is not None else _isoNow(),
+        }
+        self.issues.append(issue)
+        self.comments[issue['number']] = []
+        return issue
+
+    def addMilestone(self, title, state='open', dueOn=None, description=None):
+        milestone = {
+            'number': len(self.milestones) + 1,
+            'title': title,
+            'state': state,
+            'due_on': dueOn,
+            'description': description,
+        }
+        self.milestones.append(milestone)
+        return milestone
+
+
+class FakeGithub(object):
+    '''
+    Local HTTP server answering requests to the Github REST API from memory.
+
+    ``users`` maps tokens to logins; with ``None``, every token is accepted and used as login. Each
+    response is delayed by ``latency`` seconds. Each token can perform ``rateLimit`` requests within
+    ``rateLimitResetSeconds``, after that requests fail with status 403 like on Github.
+    '''
+    def __init__(self, users=None, latency=0.0, rateLimit=5000, rateLimitResetSeconds=3600, host='127.0.0.1',
+                 port=0):
+        self.users = users
+        self.latency = latency
+        self.rateLimit = rateLimit
+        self.rateLimitResetSeconds = rateLimitResetSeconds
+        self.requests = []
+        self._host = host
+        self._port = port
+        self._repos = {}
+        self._quotas = {}
+        self._failures = []
+        self._lock = threading.RLock()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, errorType, error, traceback):
+        self.stop()
+
+    @property
+    def url(self):
+        assert self._server is not None, u'server must be started'
+        host, port = self._server.server_address
+        return u'http://%s:%d' % (host, port)
+
+    def start(self):
+        assert self._server is None, u'server must not be started already'
+        self._server = _FakeGithubServer((self._host, self._port), _FakeGithubRequestHandler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(_POLL_INTERVAL,), name='fakegithub')
+        self._thread.daemon = True
+        self._thread.start()
+        _log.info(u'serve fake Github API at %s', self.url)
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.closeConnections()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+    def addRepo(self, ownerLogin, name, labelNames=DEFAULT_LABEL_NAMES):
+        with self._lock:
+            result = FakeRepo(ownerLogin, name, labelNames)
+            self._repos[result.fullName] = result
+        return result
+
+    def repo(self, fullName):
+        with self._lock:
+            return self._repos[fullName]
+
+    def failNext(self, count=1, status=502, message=u'Server Error', method=None, path=None, retryAfter=None):
+        '''
+        Answer the next ``count`` requests using ``method`` (any if ``None``) for a path matching the regular
+        expression ``path`` (any if ``None``) with an error.
+        '''
+        headers = {}
+        if retryAfter is not None:
+            headers['Retry-After'] = str(retryAfter)
+        with self._lock:
+            self._failures.append(_Failure(count, status, message, method, path, headers))
+
+    def failNextWithSecondaryRateLimit(self, count=1, retryAfter=1, method=None, path=None):
+        self.failNext(count, 403, u'You have triggered an abuse detection mechanism. Please wait a few minutes '
+                      u'before you try again.', method, path, retryAfter)
+
+    def requestCount(self, method=None, path=None):
+        '''
+        Number of recorded requests using ``method`` for a path matching the regular expression ``path``.
+        '''
+        pathRegex = re.compile(path) if path is not None else None
+        with self._lock:
+            return len([
+                request for request in self.requests
+                if ((method is None) or (request.method == method))
+                and ((pathRegex is None) or (pathRegex.search(request.path) is not None))])
+
+    def writeRequestCount(self):
+        return len([request for request in self.requests if request.method != 'GET'])
+
+    def _loginFor(self, token):
+        if token is None:
+            raise _FakeError(401, u'Requires authentication')
+        if self.users is None:
+            result = token
+        else:
+            result = self.users.get(token)
+            if result is None:
+                raise _FakeError(401, u'Bad credentials')
+        return result
+
+    def _quotaFor(self, token):
+        now = time.time()
+        quota = self._quotas.get(token)
+        if (quota is None) or (quota[1] <= now):
+            quota = [self.rateLimit, int(now + self.rateLimitResetSeconds)]
+            self._quotas[token] = quota
+        return quota
+
+    def _rateLimitHeaders(self, token):
+        remaining, resetTime = self._quotaFor(token)
+        return {
+            'X-RateLimit-Limit': str(self.rateLimit),
+            'X-RateLimit-Remaining': str(max(0, remaining)),
+            'X-RateLimit-Reset': str(resetTime),
+        }
+
+    def handle(self, method, url, token, data):
+        '''
+        Pair ``(status, headers, result)`` answering the request.
+        '''
+        parsedUrl = urlparse.urlparse(url)
+        path = parsedUrl.path.rstrip('/')
+        parameters = dict(urlparse.parse_qsl(parsedUrl.query))
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests.append(FakeRequest(method, path, parameters, token, data))
+            headers = {}
+            try:
+                isRateLimitRequest = (path == '/rate_limit')
+                if not isRateLimitRequest:
+                    quota = self._quotaFor(token)
+                    if quota[0] <= 0:
+                        raise _FakeError(403, u'API rate limit exceeded for %s.' % token)
+                    quota[0] -= 1
+                headers.update(self._rateLimitHeaders(token))
+                for failure in self._failures:
+                    if failure.matches(method, path):
+                        failure.count -= 1
+                        raise _FakeError(failure.status, failure.message, failure.headers)
+                status, result = self._route(method, path, parameters, token, data, headers)
+            except _FakeError, error:
+                headers.update(self._rateLimitHeaders(token))
+                headers.update(error.headers)
+                status = error.status
+                result = {'message': error.message, 'documentation_url': 'https://developer.github.com/v3'}
+        return status, headers, result
+
+    def _route(self, method, path, parameters, token, data, headers):
+        for routeMethod, routeRegex, handlerName in _ROUTES:
+            match = routeRegex.match(path)
+            if (match is not None) and (routeMethod == method):
+                handler = getattr(self, handlerName)
+                return handler(token, parameters, data, headers, *match.groups())
+        raise _FakeError(404, u'Not Found')
+
+    def _repoFor(self, owner, name):
+        result = self._repos.get(u'%s/%s' % (owner, name))
+        if result is None:
+            raise _FakeError(404, u'Not Found')
+        return result
+
+    def _issueFor(self, repo, number):
+        number = int(number)
+        if not (1 <= number <= len(repo.issues)):
+            raise _FakeError(404, u'Not Found')
+        return repo.issues[number - 1]
+
+    def _milestoneFor(self, repo, number):
+        if not isinstance(number, (int, long)) or not (1 <= number <= len(repo.milestones)):
+            raise _FakeError(422, u'Validation Failed: milestone %r does not exist' % (number,))
+        return repo.milestones[number - 1]
+
+    def _labelsFor(self, repo, labelNames):
+        result = []
+        for labelName in labelNames:
+            if labelName not in repo.labels:
+                # Like Github, create labels that do not exist yet.
+                repo.labels[labelName] = {'name': labelName, 'color': _DEFAULT_LABEL_COLOR}
+            result.append(labelName)
+        return result
+
+    def _userJson(self, login):
+        return {
+            'login': login,
+            'id': abs(hash(login)) % 1000000,
+            'name': login,
+            'url': u'%s/users/%s' % (self.url, login),
+            'type': 'User',
+        }
+
+    def _repoJson(self, repo):
+        return {
+            'id': abs(hash(repo.fullName)) % 1000000,
+            'name': repo.name,
+            'full_name': repo.fullName,
+            'owner': self._userJson(repo.ownerLogin),
+            'url': u'%s/repos/%s' % (self.url, repo.fullName),
+            'html_url': u'https://github.com/%s' % repo.fullName,
+            'has_issues': True,
+            'private': False,
+        }
+
+    def _labelJson(self, repo, label):
+        result = dict(label)
+        result['url'] = u'%s/repos/%s/labels/%s' % (
+                self.url, repo.fullName, urllib.quote(label['name'].encode('utf-8')))
+        return result
+
+    def _milestoneJson(self, repo, milestone):
+        result = dict(milestone)
+        result['url'] = u'%s/repos/%s/milestones/%d' % (self.url, repo.fullName, milestone['number'])
+        return result
+
+    def _issueJson(self, repo, issue):
+        result = dict(issue)
+        result['url'] = u'%s/repos/%s/issues/%d' % (self.url, repo.fullName, issue['number'])
+        result['html_url'] = u'https://github.com/%s/issues/%d' % (repo.fullName, issue['number'])
+        result['labels'] = [self._labelJson(repo, repo.labels[labelName]) for labelName in issue['labels']]
+        if issue['milestone'] is not None:
+            result['milestone'] = self._milestoneJson(repo, repo.milestones[issue['milestone'] - 1])
+        if issue['assignee'] is not None:
+            result['assignee'] = self._userJson(issue['assignee'])
+        result['user'] = self._userJson(issue['user'])
+        result['comments'] = len(repo.comments[issue['number']])
+        result['created_at'] = issue.get('created_at', _TIMESTAMP)
+        result['updated_at'] = issue.get('updated_at', _TIMESTAMP)
+        return result
+
+    def _importJson(self, repo, issueImport):
+        result = {
+            'id': issueImport['id'],
+            'status': issueImport['status'],
+            'url': u'%s/repos/%s/import/issues/%d' % (self.url, repo.fullName, issueImport['id']),
+            'import_issues_url': u'%s/repos/%s/import/issues' % (self.url, repo.fullName),
+            'repository_url': u'%s/repos/%s' % (self.url, repo.fullName),
+            'created_at': _TIMESTAMP,
+            'updated_at': _TIMESTAMP,
+        }
+        if issueImport['status'] == 'imported':
+            result['issue_url'] = u'%s/repos/%s/issues/%d' % (self.url, repo.fullName, issueImport['issueNumber'])
+        elif issueImport['status'] == 'failed':
+            result['errors'] = issueImport['errors']
+        return result
+
+    def _page(self, items, parameters, path, headers):
+        perPage = min(_MAX_PER_PAGE, int(parameters.get('per_page', 30)))
+        page = int(parameters.get('page', 1))
+        lastPage = max(1, (len(items) + perPage - 1) // perPage)
+        if page < lastPage:
+            def pageUrl(pageNumber):
+                pageParameters = dict(parameters)
+                pageParameters['page'] = pageNumber
+                return u'%s%s?%s' % (self.url, path, urllib.urlencode(sorted(pageParameters.items())))
+            headers['Link'] = u'<%s>; rel="next", <%s>; rel="last"' % (pageUrl(page + 1), pageUrl(lastPage))
+        return items[(page - 1) * perPage:page * perPage]
+
+    def _getRateLimit(self, token, parameters, data, headers):
+        remaining, resetTime = self._quotaFor(token)
+        rate = {'limit': self.rateLimit, 'remaining': max(0, remaining), 'reset': resetTime}
+        return 200, {'resources': {'core': rate, 'search': rate}, 'rate': rate}
+
+    def _getUser(self, token, parameters, data, headers):
+        return 200, self._userJson(self._loginFor(token))
+
+    def _getNamedUser(self, token, parameters, data, headers, login):
+        return 200, self._userJson(login)
+
+    def _getRepo(self, token, parameters, data, headers, owner, name):
+        self._loginFor(token)
+        return 200, self._repoJson(self._repoFor(owner, name))
+
+    def _getIssues(self, token, parameters, data, headers, owner, name):
+        repo = self._repoFor(owner, name)
+        state = parameters.get('state', 'open')
+        issues = [issue for issue in repo.issues if state in ('all', issue['state'])]
+        # Like Github, sort by creation time, which need not follow the numbers of imported issues.
+        sortKey = 'updated_at' if parameters.get('sort') == 'updated' else 'created_at'
+        issues.sort(key=lambda issue: issue.get(sortKey, issue['created_at']))
+        if parameters.get('direction', 'desc') == 'desc':
+            issues.reverse()
+        path = u'/repos/%s/%s/issues' % (owner, name)
+        return 200, [self._issueJson(repo, issue) for issue in self._page(issues, parameters, path, headers)]
+
+    def _getIssue(self, token, parameters, data, headers, owner, name, number):
+        repo = self._repoFor(owner, name)
+        return 200, self._issueJson(repo, self._issueFor(repo, number))
+
+    def _postIssue(self, token, parameters, data, headers, owner, name):
+        repo = self._repoFor(owner, name)
+        if not (data or {}).get('title'):
+            raise _FakeError(422, u'Validation Failed: title must be specified')
+        milestoneNumber = data.get('milestone')
+        if milestoneNumber is not None:
+            self._milestoneFor(repo, milestoneNumber)
+        labels = self._labelsFor(repo, data.get('labels', []))
+        login = self._loginFor(token)
+        issue = repo.addIssue(data['title'], data.get('body', u''), author=login)
+        if (repo.pushLogins is None) or (login in repo.pushLogins):
+            issue['milestone'] = milestoneNumber
+            issue['labels'] = labels
+            issue['assignee'] = data.get('assignee')
+        return 201, self._issueJson(repo, issue)
+
+    def _patchIssue(self, token, parameters, data, headers, owner, name, number):
+        repo = self._repoFor(owner, name)
+        issue = self._issueFor(repo, number)
+        data = data or {}
+        for key in ('title', 'body', 'assignee'):
+            if key in data:
+                issue[key] = data[key]
+        if 'state' in data:
+            if data['state'] not in ('open', 'closed'):
+                raise _FakeError(422, u'Validation Failed: state must be open or closed')
+            issue['state'] = data['state']
+        if 'milestone' in data:
+            if data['milestone'] is not None:
+                self._milestoneFor(repo, data['milestone'])
+            issue['milestone'] = data['milestone']
+        if 'labels' in data:
+            issue['labels'] = self._labelsFor(repo, data['labels'])
+        return 200, self._issueJson(repo, issue)
+
+    def _getComments(self, token, parameters, data, headers, owner, name, number):
+        repo = self._repoFor(owner, name)
+        issue = self._issueFor(repo, number)
+        path = u'/repos/%s/%s/issues/%s/comments' % (owner, name, number)
+        return 200, self._page(repo.comments[issue['number']], parameters, path, headers)
+
+    def _postComment(self, token, parameters, data, headers, owner, name, number):
+        repo = self._repoFor(owner, name)
+        issue = self._issueFor(repo, number)
+        if not (data or {}).get('body'):
+            raise _FakeError(422, u'Validation Failed: body must be specified')
+        return 201, self._addComment(repo, issue, data['body'], self._loginFor(token))
+
+    def _addComment(self, repo, issue, body, login, createdAt=_TIMESTAMP):
+        comments = repo.comments[issue['number']]
+        commentId = sum(len(issueComments) for issueComments in repo.comments.values()) + 1
+        comment = {
+            'id': commentId,
+            'url': u'%s/repos/%s/issues/comments/%d' % (self.url, repo.fullName, commentId),
+            'body': body,
+            'user': self._userJson(login),
+            'created_at': createdAt,
+            'updated_at': createdAt,
+        }
+        comments.append(comment)
+        return comment
+
+    def _getLabels(self, token, parameters, data, headers, owner, name):
+        repo = self._repoFor(owner, name)
+        labels = [self._labelJson(repo, label) for label in repo.labels.values()]
+        return 200, self._page(labels, parameters, u'/repos/%s/%s/labels' % (owner, name), headers)
+
+    def _postLabel(self, token, parameters, data, headers, owner, name):
+        repo = self._repoFor(owner, name)
+        labelName = (data or {}).get('name')
+        if not labelName:
+            raise _FakeError(422, u'Validation Failed: name must be specified')
+        if labelName in repo.labels:
+            raise _FakeError(422, u'Validation Failed: label "%s" already_exists' % labelName)
+        label = {'name': labelName, 'color': data.get('color', _DEFAULT_LABEL_COLOR)}
+        repo.labels[labelName] = label
+        return 201, self._labelJson(repo, label)
+
+    def _getMilestones(self, token, parameters, data, headers, owner, name):
+        repo = self._repoFor(owner, name)
+        state = parameters.get('state', 'open')
+        milestones = [
+            self._milestoneJson(repo, milestone) for milestone in repo.milestones
+            if state in ('all', milestone['state'])]
+        return 200, self._page(milestones, parameters, u'/repos/%s/%s/milestones' % (owner, name), headers)
+
+    def _postMilestone(self, token, parameters, data, headers, owner, name):
+        repo = self._repoFor(owner, name)
+        title = (data or {}).get('title')
+        if not title:
+            raise _FakeError(422, u'Validation Failed: title must be specified')
+        if title in [milestone['title'] for milestone in repo.milestones]:
+            raise _FakeError(422, u'Validation Failed: milestone "%s" already_exists' % title)
+        milestone = repo.addMilestone(title, data.get('state', 'open'), data.get('due_on'), data.get('description'))
+        return 201, self._milestoneJson(repo, milestone)
+
+    def _postImport(self, token, parameters, data, headers, owner, name):
+        repo = self._repoFor(owner, name)
+        login = self._loginFor(token)
+        if not isinstance((data or {}).get('issue'), dict):
+            raise _FakeError(422, u'Validation Failed: issue must be specified')
+        issueImport = {'id': len(repo.imports) + 1, 'status': 'pending', 'data': data, 'login': login}
+        repo.imports.append(issueImport)
+        return 202, self._importJson(repo, issueImport)
+
+    def _getImport(self, token, parameters, data, headers, owner, name, importId):
+        repo = self._repoFor(owner, name)
+        importId = int(importId)
+        if not (1 <= importId <= len(repo.imports)):
+            raise _FakeError(404, u'Not Found')
+        # Like Github, process imports in the order they have been submitted.
+        for issueImport in repo.imports[:importId]:
+            if issueImport['status'] == 'pending':
+                self._processImport(repo, issueImport)
+        return 200, self._importJson(repo, repo.imports[importId - 1])
+
+    def _processImport(self, repo, issueImport):
+        issueData = issueImport['data']['issue']
+        commentsData = issueImport['data'].get('comments', [])
+        errors = []
+        for field in ('title', 'body'):
+            if not issueData.get(field):
+                errors.append({'resource': 'Issue', 'field': field, 'code': 'missing_field'})
+        milestoneNumber = issueData.get('milestone')
+        if (milestoneNumber is not None) and not (1 <= milestoneNumber <= len(repo.milestones)):
+            errors.append({'resource': 'Issue', 'field': 'milestone', 'value': milestoneNumber, 'code': 'invalid'})
+        for commentIndex, commentData in enumerate(commentsData):
+            if not commentData.get('body'):
+                errors.append({'location': '/comments[%d]' % commentIndex, 'resource': 'IssueComment',
+                               'field': 'body', 'code': 'missing_field'})
+        if repo.importFailureCount > 0:
+            repo.importFailureCount -= 1
+            errors.append({'resource': 'Issue', 'code': 'custom', 'message': u'injected failure'})
+        if errors:
+            issueImport['status'] = 'failed'
+            issueImport['errors'] = errors
+        else:
+            issue = repo.addIssue(issueData['title'], issueData['body'],
+                                  'closed' if issueData.get('closed') else 'open', issueImport['login'])
+            issue['milestone'] = milestoneNumber
+            issue['labels'] = self._labelsFor(repo, issueData.get('labels', []))
+            issue['assignee'] = issueData.get('assignee')
+            for key in ('created_at', 'updated_at', 'closed_at'):
+                if key in issueData:
+                    issue[key] = issueData[key]
+            for commentData in commentsData:
+                self._addComment(repo, issue, commentData['body'], issueImport['login'],
+                                 commentData.get('created_at', _TIMESTAMP))
+            issueImport['status'] = 'imported'
+            issueImport['issueNumber'] = issue['number']
+
+
+_REPO_PATH = r'^/repos/([^/]+)/([^/]+)'
+_ROUTES = [(method, re.compile(pattern + '$'), handlerName) for method, pattern, handlerName in [
+    ('GET', r'^/rate_limit', '_getRateLimit'),
+    ('GET', r'^/user', '_getUser'),
+    ('GET', r'^/users/([^/]+)', '_getNamedUser'),
+    ('GET', _REPO_PATH, '_getRepo'),
+    ('GET', _REPO_PATH + r'/issues', '_getIssues'),
+    ('POST', _REPO_PATH + r'/issues', '_postIssue'),
+    ('GET', _REPO_PATH + r'/issues/(\d+)', '_getIssue'),
+    ('PATCH', _REPO_PATH + r'/issues/(\d+)', '_patchIssue'),
+    ('GET', _REPO_PATH + r'/issues/(\d+)/comments', '_getComments'),
+    ('POST', _REPO_PATH + r'/issues/(\d+)/comments', '_postComment'),
+    ('GET', _REPO_PATH + r'/labels', '_getLabels'),
+    ('POST', _REPO_PATH + r'/labels', '_postLabel'),
+    ('GET', _REPO_PATH + r'/milestones', '_getMilestones'),
+    ('POST', _REPO_PATH + r'/milestones', '_postMilestone'),
+    ('POST', _REPO_PATH + r'/import/issues', '_postImport'),
+    ('GET', _REPO_PATH + r'/import/issues/(\d+)', '_getImport'),
+]]
+
+
+class _FakeGithubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, serverAddress, requestHandlerClass):
+        BaseHTTPServer.HTTPServer.__init__(self, serverAddress, requestHandlerClass)
+        self._connections = set()
+        self._connectionsLock = threading.Lock()
+
+    def process_request_thread(self, request, clientAddress):
+        with self._connectionsLock:
+            self._connections.add(request)
+        try:
+            SocketServer.ThreadingMixIn.process_request_thread(self, request, clientAddress)
+        finally:
+            with self._connectionsLock:
+                self._connections.discard(request)
+
+    def handle_error(self, request, clientAddress):
+        # Connections closed by clients or `closeConnections()` are no error.
+        if not isinstance(sys.exc_info()[1], socket.error):
+            BaseHTTPServer.HTTPServer.handle_error(self, request, clientAddress)
+
+    def closeConnections(self, timeout=5.0):
+        '''
+        Close connections kept alive by clients and wait for the threads serving them to end.
+        '''
+        with self._connectionsLock:
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+        endTime = time.time() + timeout
+        while self._connections and (time.time() < endTime):
+            time.sleep(0.01)
+
+
+class _FakeGithubRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # Github clients keep their connection alive.
+    protocol_version = 'HTTP/1.1'
+    # Send each response at once instead of waiting for the client to acknowledge its parts.
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def _token(self):
+        authorization = self.headers.get('Authorization', '')
+        words = authorization.split()
+        if (len(words) == 2) and (words[0].lower() == 'token'):
+            result = words[1]
+        else:
+            result = None
+        return result
+
+    def _handle(self, method):
+        contentLength = int(self.headers.get('Content-Length', 0))
+        if contentLength > 0:
+            data = json.loads(self.rfile.read(contentLength).decode('utf-8'))
+        else:
+            data = None
+        status, headers, result = self.server.fake.handle(method, self.path, self._token(), data)
+        content = json.dumps(result)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def log_message(self, format, *arguments):
+        _log.debug(format, *arguments)
+
+
+def main(arguments=None):
+    if arguments is None:
+        arguments = sys.argv[1:]
+    parser = optparse.OptionParser(usage='usage: %prog [options] OWNER/REPO...\n\n  Serve a fake Github API.')
+    parser.add_option('-p', '--port', type='int', default=8765, help='port to listen at (default: %default)')
+    parser.add_option('-l', '--latency', type='float', default=0.0,
+                      help='seconds to delay each response (default: %default)')
+    parser.add_option('-r', '--rate-limit', type='int', default=5000, dest='rateLimit',
+                      help='requests per hour and token (default: %default)')
+    options, repoNames = parser.parse_args(arguments)
+    if len(repoNames) == 0:
+        parser.error(u'at least one OWNER/REPO must be specified')
+    logging.basicConfig(level=logging.INFO)
+    fake = FakeGithub(latency=options.latency, rateLimit=options.rateLimit, port=options.port)
+    for repoName in repoNames:
+        if repoName.count('/') != 1:
+            parser.error(u'repository must be specified as OWNER/REPO but is: %s' % repoName)
+        fake.addRepo(*repoName.split('/'))
+    fake.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        _log.info(u'stop fake Github API after %d requests', len(fake.requests))
+    finally:
+        fake.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,13 @@
+-- All Trac milestones with their due date, completion time and description.
+copy
+(select
+    name,
+    due / 1000000 as PosixDue,
+    completed / 1000000 as PosixCompleted,
+    description
+from
+    milestone
+order
+    by name)
+to '/tmp/milestones.csv'
+with CSV
@@ -0,0 +1,115 @@
+'''
+Microbenchmark for `translator.Translator`.
+
+Run it from the project folder using::
+
+  $ python test/benchmark_translator.py
+
+It translates the ticket descriptions and comments of ``test/cutplace_tickets.csv`` and
+``test/cutplace_comments.csv`` several times and reports the throughput of the translator with and without
+its cache, compared to compiling the ticket specific substitutions for each call as earlier versions did.
+'''
+# Copyright (c) 2012-2013, Thomas Aglassinger
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of Thomas Aglassinger nor the names of its contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 'AS IS'
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+import collections
+import csv
+import os.path
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import translator
+
+_Owner = collections.namedtuple('_Owner', ['login'])
+_Repo = collections.namedtuple('_Repo', ['owner', 'name'])
+
+_REPEAT_COUNT = 20
+_TICKET_COUNT = 1000
+
+
+class _RecompilingTranslator(translator.Translator):
+    '''
+    Translator that compiles the ticket specific substitutions for each call like earlier versions did.
+    '''
+    def translate(self, text, ticketId=''):
+        subs = [[r"\[\[Image\((\S*?)\,\s{0,}\S*?\)\]\]", r"![\1]({attachmentsPrefix}/{ticketId}/\1)".format(
+                    attachmentsPrefix=self.attachmentsPrefix, ticketId=ticketId)],
+                [r"\[\[Image\((\S*?)\)\]\]", r"![\1]({attachmentsPrefix}/{ticketId}/\1)".format(
+                    attachmentsPrefix=self.attachmentsPrefix, ticketId=ticketId)],
+                [r"attachment:(\S*?)", r"{attachmentsPrefix}/{ticketId}/\1".format(
+                    attachmentsPrefix=self.attachmentsPrefix, ticketId=ticketId)]]
+        for r, s in subs:
+            p = re.compile(r, re.DOTALL)
+            text = p.sub(s, text)
+        for p, s in self.subs:
+            text = p.sub(s, text)
+        return text
+
+
+def _texts():
+    result = []
+    testFolder = os.path.dirname(os.path.abspath(__file__))
+    for csvName, column in [('cutplace_tickets.csv', 8), ('cutplace_comments.csv', 3)]:
+        with open(os.path.join(testFolder, csvName), 'rb') as csvFile:
+            rows = list(csv.reader(csvFile))[1:]
+        result.extend(row[column].decode('utf-8') for row in rows)
+    return result
+
+
+def _benchmark(name, translatorToMeasure, texts):
+    startTime = time.time()
+    translationCount = 0
+    for _ in xrange(_REPEAT_COUNT):
+        for textIndex, text in enumerate(texts):
+            translatorToMeasure.translate(text, ticketId=textIndex % _TICKET_COUNT)
+            translationCount += 1
+    duration = time.time() - startTime
+    print '%-30s %8.0f texts/s' % (name, translationCount / duration)
+    return duration
+
+
+def main():
+    repo = _Repo(_Owner('roskakori'), 'tratihubis')
+    ticketsToIssuesMap = dict((ticketId, ticketId) for ticketId in xrange(_TICKET_COUNT))
+    texts = _texts()
+
+    def createTranslator(translatorClass, cacheSize=1024):
+        return translatorClass(repo, ticketsToIssuesMap, trac_url='https://trac.example.com',
+                attachmentsPrefix='https://example.com/attachments', cacheSize=cacheSize)
+
+    print 'translate %d texts %d times' % (len(texts), _REPEAT_COUNT)
+    legacyDuration = _benchmark('compile for each call', createTranslator(_RecompilingTranslator, 0), texts)
+    uncachedDuration = _benchmark('precompiled', createTranslator(translator.Translator, 0), texts)
+    cachedDuration = _benchmark('precompiled and cached', createTranslator(translator.Translator), texts)
+    print 'speedup: %.1f (precompiled), %.1f (precompiled and cached)' % (
+            legacyDuration / uncachedDuration, legacyDuration / cachedDuration)
+
+
+if __name__ == '__main__':
+    main()
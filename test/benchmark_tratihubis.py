@@ -0,0 +1,445 @@
+'''
+End-to-end benchmark for tratihubis using synthetic Trac exports and a fake Github API.
+
+Run it from the project folder using::
+
+  $ python test/benchmark_tratihubis.py --tickets 1000
+
+It writes tickets, comments and attachments CSVs in the layout of ``query_tickets.sql``,
+``query_comments.sql`` and ``query_attachments.sql`` and a Trac SQLite database with the same data to a
+temporary folder and then measures each stage of a migration in a separate process:
+
+* reading comments and attachments,
+* indexing and reading tickets,
+* reading tickets with their comments directly from the Trac database,
+* loading all comments or tickets into memory at once, which shows the memory needed per record,
+* translating Wiki markup,
+* migrating the tickets to a fake Github API started by the benchmark.
+
+For each stage it reports the duration, the tickets processed per second and the peak resident set size of
+the process. For the migration it also reports the number of API calls per ticket. Large exports of up
+to 1 million tickets are best migrated with ``--pretend``, which only performs the reading API calls.
+
+Use ``--report`` to store the results as JSON, for example to compare them with a later run.
+'''
+# Copyright (c) 2012-2013, Thomas Aglassinger
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of Thomas Aglassinger nor the names of its contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 'AS IS'
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+import csv
+import json
+import logging
+import multiprocessing
+import optparse
+import os
+import os.path
+import random
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakegithub
+import translator
+import tratihubis
+
+_LOGIN = 'benchmark'
+_REPO_NAME = 'tratihubis'
+
+_COMPONENTS = ['core', 'ui', 'docs', 'build', 'network', 'storage', 'None']
+_MILESTONES = ['0.%d' % minor for minor in range(1, 20)] + ['']
+_TYPES = ['defect', 'enhancement', 'task']
+_RESOLUTIONS = ['fixed', 'fixed', 'fixed', 'wontfix', 'duplicate', 'invalid', 'worksforme']
+_USERS = ['user%02d' % userIndex for userIndex in range(50)]
+_WORDS = (u'the a an ticket issue crash error when while opening saving file dialog window list table import '
+          u'export user password login network timeout value number date excel csv parser fails works '
+          u'should would could please fix add remove change update release version').split()
+_MARKUP = [
+    u'See ticket:%(ticket)d for details.',
+    u"This is '''important''' and ''urgent''.",
+    u'{{{\nTraceback (most recent call last):\n  File "x.py", line %(ticket)d\n}}}',
+    u'Fixed in r%(revision)d and changeset:%(revision)d.',
+    u' * first item\n * second item',
+    u'[[Image(screenshot.png)]]',
+    u'== Steps to reproduce ==',
+    u'Use {{{--verbose}}} to see more.',
+]
+
+#: Start of the time range of synthetic tickets.
+_START_TIME = 1199145600
+
+
+def _text(randomizer, ticketId, wordCount, markupProbability=0.3):
+    words = [randomizer.choice(_WORDS) for _ in xrange(wordCount)]
+    result = u' '.join(words)
+    if randomizer.random() < markupProbability:
+        markup = randomizer.choice(_MARKUP) % {
+            'ticket': randomizer.randint(1, ticketId), 'revision': randomizer.randint(1, 9999)}
+        result += u'\n\n' + markup
+    return result
+
+
+def _writeRow(csvWriter, row):
+    csvWriter.writerow([unicode(cell).encode('utf-8') for cell in row])
+
+
+def writeSyntheticExport(folder, ticketCount, commentsPerTicket=3, attachmentsPerTicket=0.1, seed=0):
+    '''
+    Write ``tickets.csv``, ``comments.csv`` and ``attachments.csv`` with ``ticketCount`` tickets and on
+    average ``commentsPerTicket`` comments and ``attachmentsPerTicket`` attachments per ticket to
+    ``folder`` and return the paths to them.
+    '''
+    randomizer = random.Random(seed)
+    ticketsCsvPath = os.path.join(folder, 'tickets.csv')
+    commentsCsvPath = os.path.join(folder, 'comments.csv')
+    attachmentsCsvPath = os.path.join(folder, 'attachments.csv')
+    with open(ticketsCsvPath, 'wb') as ticketsCsvFile:
+        with open(commentsCsvPath, 'wb') as commentsCsvFile:
+            with open(attachmentsCsvPath, 'wb') as attachmentsCsvFile:
+                ticketsWriter = csv.writer(ticketsCsvFile)
+                commentsWriter = csv.writer(commentsCsvFile)
+                attachmentsWriter = csv.writer(attachmentsCsvFile)
+                for ticketId in xrange(1, ticketCount + 1):
+                    createdTime = _START_TIME + ticketId * 600
+                    isClosed = randomizer.random() < 0.7
+                    commentCount = randomizer.randint(0, int(round(2 * commentsPerTicket)))
+                    modifiedTime = createdTime + 3600 * (commentCount + 1)
+                    _writeRow(ticketsWriter, [
+                        ticketId,
+                        randomizer.choice(_TYPES),
+                        randomizer.choice(_USERS),
+                        randomizer.choice(_USERS),
+                        randomizer.choice(_MILESTONES),
+                        'closed' if isClosed else 'new',
+                        randomizer.choice(_RESOLUTIONS) if isClosed else 'None',
+                        _text(randomizer, ticketId, randomizer.randint(3, 10), 0.05),
+                        _text(randomizer, ticketId, randomizer.randint(10, 200)),
+                        createdTime,
+                        modifiedTime,
+                        randomizer.choice(_COMPONENTS),
+                    ])
+                    for commentIndex in xrange(commentCount):
+                        _writeRow(commentsWriter, [
+                            ticketId,
+                            createdTime + 3600 * (commentIndex + 1),
+                            randomizer.choice(_USERS),
+                            _text(randomizer, ticketId, randomizer.randint(3, 80)),
+                        ])
+                    if randomizer.random() < attachmentsPerTicket:
+                        _writeRow(attachmentsWriter, [
+                            ticketId,
+                            'screenshot_%d.png' % ticketId,
+                            createdTime + 60,
+                            randomizer.choice(_USERS),
+                        ])
+    return ticketsCsvPath, commentsCsvPath, attachmentsCsvPath
+
+
+_TRAC_SCHEMA = [
+    'create table ticket (id integer primary key, type text, time integer, changetime integer, component text, '
+    'severity text, priority text, owner text, reporter text, cc text, version text, milestone text, '
+    'status text, resolution text, summary text, description text, keywords text)',
+    'create table ticket_change (ticket integer, time integer, author text, field text, oldvalue text, '
+    'newvalue text, unique (ticket, time, field))',
+    'create table attachment (type text, id text, filename text, size integer, time integer, description text, '
+    'author text, ipnr text, unique (type, id, filename))',
+    'create table milestone (name text primary key, due integer, completed integer, description text)',
+]
+
+
+def _csvRows(csvPath):
+    if csvPath is not None:
+        with open(csvPath, 'rb') as csvFile:
+            for row in csv.reader(csvFile):
+                yield [cell.decode('utf-8') for cell in row]
+
+
+def writeTracDatabase(databasePath, ticketsCsvPath, commentsCsvPath=None, attachmentsCsvPath=None,
+                      milestonesCsvPath=None):
+    '''
+    Write a Trac SQLite database to ``databasePath`` with the tickets, comments, attachments and milestones
+    from CSV files in the layout of the ``query_*.sql`` scripts. Time stamps are stored in microseconds like
+    Trac does. Besides comments, each ticket gets a change of its status, which must not be read as comment.
+    '''
+    microseconds = 1000000
+    connection = sqlite3.connect(databasePath)
+    try:
+        for statement in _TRAC_SCHEMA:
+            connection.execute(statement)
+        connection.executemany(
+            'insert into ticket (id, type, owner, reporter, milestone, status, resolution, summary, description, '
+            'time, changetime, component) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (row[:9] + [long(row[9]) * microseconds, long(row[10]) * microseconds, row[11]]
+             for row in _csvRows(ticketsCsvPath)))
+        connection.execute(
+            "insert into ticket_change select id, changetime, owner, 'status', 'new', status from ticket")
+        connection.executemany(
+            "insert into ticket_change values (?, ?, ?, 'comment', '', ?)",
+            ((long(row[0]), long(row[1]) * microseconds + commentIndex, row[2], row[3])
+             for commentIndex, row in enumerate(_csvRows(commentsCsvPath))))
+        connection.executemany(
+            "insert into attachment values ('ticket', ?, ?, 0, ?, '', ?, '127.0.0.1')",
+            ((row[0], row[1], long(row[2]) * microseconds, row[3]) for row in _csvRows(attachmentsCsvPath)))
+        connection.execute(
+            "insert into attachment values ('wiki', 'WikiStart', 'logo.png', 0, 0, '', 'admin', '127.0.0.1')")
+        connection.executemany(
+            'insert into milestone values (?, ?, ?, ?)',
+            ((row[0], long(row[1] or 0) * microseconds, long(row[2] or 0) * microseconds, row[3])
+             for row in _csvRows(milestonesCsvPath)))
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def _peakRssInKilobytes():
+    # Linux reports kilobytes, Mac OS X bytes.
+    result = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        result //= 1024
+    return result
+
+
+def _readComments(paths, options, baseUrl):
+    ticketSource = tratihubis._TracTicketSource(paths[0])
+    commentSource = tratihubis._TracCommentSource(paths[1], ticketSource.isSorted)
+    try:
+        for ticketId in ticketSource.ticketIds():
+            commentSource.commentsFor(ticketId)
+    finally:
+        commentSource.close()
+    return len(ticketSource)
+
+
+def _readDatabase(paths, options, baseUrl):
+    tracDatabase = tratihubis._TracDatabase(paths[3])
+    try:
+        ticketSource = tratihubis._TracDatabaseTicketSource(tracDatabase)
+        commentSource = tratihubis._TracDatabaseCommentSource(tracDatabase)
+        for ticketMap in ticketSource:
+            commentSource.commentsFor(ticketMap['id'])
+        commentSource.close()
+    finally:
+        tracDatabase.close()
+    return len(ticketSource)
+
+
+def _loadComments(paths, options, baseUrl):
+    ticketToCommentsMap = tratihubis._createTicketToCommentsMap(paths[1])
+    return len(ticketToCommentsMap)
+
+
+def _loadTickets(paths, options, baseUrl):
+    tickets = list(tratihubis._TracTicketSource(paths[0]))
+    return len(tickets)
+
+
+def _readAttachments(paths, options, baseUrl):
+    return len(tratihubis._createTicketsToAttachmentsMap(paths[2], 'https://example.com/attachments'))
+
+
+def _indexTickets(paths, options, baseUrl):
+    return len(tratihubis._TracTicketSource(paths[0]))
+
+
+def _readTickets(paths, options, baseUrl):
+    return sum(1 for _ in tratihubis._TracTicketSource(paths[0]))
+
+
+def _translate(paths, options, baseUrl):
+    ticketSource = tratihubis._TracTicketSource(paths[0])
+    ticketsToIssuesMap = tratihubis.createTicketsToIssuesMap(ticketSource, {}, 1, 0)
+    ticketTranslator = tratihubis._TicketTranslator(
+        translator.Translator(None, ticketsToIssuesMap, trac_url='https://trac.example.com',
+                              attachmentsPrefix='https://example.com/attachments'),
+        options.translateProcesses)
+    commentSource = tratihubis._TracCommentSource(paths[1], ticketSource.isSorted)
+
+    def ticketMapsAndComments():
+        for ticketMap in ticketSource:
+            yield ticketMap, commentSource.commentsFor(ticketMap['id'])
+
+    try:
+        return sum(1 for _ in ticketTranslator.translatedTickets(ticketMapsAndComments()))
+    finally:
+        commentSource.close()
+
+
+def _userMapping(tokenCount):
+    '''
+    Mapping for option ``users`` that spreads the synthetic users on ``tokenCount`` tokens.
+    '''
+    if tokenCount <= 1:
+        result = '*:*'
+    else:
+        result = ', '.join('%s: token%d' % (user, userIndex % tokenCount) for userIndex, user in enumerate(_USERS))
+    return result
+
+
+def _migrate(paths, options, baseUrl):
+    hub = tratihubis._createHub(_LOGIN, baseUrl)
+    repo = hub.get_user().get_repo(_REPO_NAME)
+    tratihubis.migrateTickets(hub, repo, _LOGIN, paths[0], paths[1], paths[2],
+            labelMapping='type=defect: bug, type=enhancement: enhancement, resolution=wontfix: wontfix',
+            attachmentsPrefix='https://example.com/attachments', pretend=options.pretend,
+            trac_url='https://trac.example.com', convert_text=True, workerCount=options.workers,
+            writeRate=options.writeRate, translateProcessCount=options.translateProcesses, baseUrl=baseUrl,
+            writer=options.writer, userMapping=_userMapping(options.tokens), tokenQueues=options.tokenQueues,
+            combineWrites=options.combineWrites)
+    return len(tratihubis._TracTicketSource(paths[0]))
+
+
+def _measuredStage(resultConnection, stageFunction, paths, options, baseUrl):
+    # The migration prints some details, which would drown the results.
+    logging.getLogger('tratihubis').setLevel(logging.WARNING)
+    sys.stdout = open(os.devnull, 'w')
+    startTime = time.time()
+    ticketCount = stageFunction(paths, options, baseUrl)
+    duration = time.time() - startTime
+    resultConnection.send((ticketCount, duration, _peakRssInKilobytes()))
+    resultConnection.close()
+
+
+_STAGES = [
+    ('read comments', _readComments),
+    ('load comments', _loadComments),
+    ('read attachments', _readAttachments),
+    ('index tickets', _indexTickets),
+    ('read tickets', _readTickets),
+    ('load tickets', _loadTickets),
+    ('read database', _readDatabase),
+    ('translate', _translate),
+    ('migrate', _migrate),
+]
+
+
+def _parsedOptions(arguments):
+    parser = optparse.OptionParser(usage='usage: %prog [options]\n\n  Benchmark tratihubis with synthetic data.')
+    parser.add_option('-t', '--tickets', type='int', default=1000, help='number of tickets (default: %default)')
+    parser.add_option('-c', '--comments-per-ticket', type='float', default=3, dest='commentsPerTicket',
+                      help='average number of comments per ticket (default: %default)')
+    parser.add_option('-l', '--latency', type='float', default=0.0,
+                      help='seconds the fake Github API delays each response (default: %default)')
+    parser.add_option('-p', '--pretend', action='store_true', help='migrate without writing to the fake Github API')
+    parser.add_option('-w', '--workers', type='int', default=1, help='value for option workers (default: %default)')
+    parser.add_option('--translate-processes', type='int', default=1, dest='translateProcesses',
+                      help='value for option translate_processes (default: %default)')
+    parser.add_option('--writer', choices=list(tratihubis._WRITERS), default=tratihubis._WRITER_ISSUES,
+                      help='value for option writer (default: %default)')
+    parser.add_option('--combine-writes', action='store_true', dest='combineWrites',
+                      help='value for option combine_writes')
+    parser.add_option('--tokens', type='int', default=1,
+                      help='number of tokens the synthetic users are mapped to (default: %default)')
+    parser.add_option('--token-queues', action='store_true', dest='tokenQueues',
+                      help='value for option token_queues')
+    parser.add_option('--write-rate', type='float', default=1000000, dest='writeRate',
+                      help='value for option write_rate (default: %default)')
+    parser.add_option('-s', '--stage', action='append', dest='stages', metavar='STAGE',
+                      help='stage to measure, can be specified multiple times (default: all stages)')
+    parser.add_option('-r', '--report', metavar='FILE', help='write results as JSON to FILE')
+    options, others = parser.parse_args(arguments)
+    if others:
+        parser.error(u'unknown options must be removed: %s' % others)
+    stageNames = [stageName for stageName, _ in _STAGES]
+    for stageName in options.stages or []:
+        if stageName not in stageNames:
+            parser.error(u'stage must be one of %s but is: %s' % (stageNames, stageName))
+    return options
+
+
+def main(arguments=None):
+    if arguments is None:
+        arguments = sys.argv[1:]
+    options = _parsedOptions(arguments)
+    folder = tempfile.mkdtemp(prefix='tratihubis_benchmark_')
+    results = {
+        'tickets': options.tickets,
+        'commentsPerTicket': options.commentsPerTicket,
+        'latency': options.latency,
+        'pretend': bool(options.pretend),
+        'workers': options.workers,
+        'translateProcesses': options.translateProcesses,
+        'writer': options.writer,
+        'tokens': options.tokens,
+        'tokenQueues': bool(options.tokenQueues),
+        'combineWrites': bool(options.combineWrites),
+        'writeRate': options.writeRate,
+        'stages': [],
+    }
+    try:
+        startTime = time.time()
+        paths = writeSyntheticExport(folder, options.tickets, options.commentsPerTicket)
+        databasePath = os.path.join(folder, 'trac.db')
+        writeTracDatabase(databasePath, *paths)
+        paths += (databasePath,)
+        print 'generated %d tickets in %.1f seconds: %.1f MB' % (
+            options.tickets, time.time() - startTime, sum(os.path.getsize(path) for path in paths[:3]) / 1e6)
+        print '%-18s %10s %12s %12s %14s' % ('stage', 'seconds', 'tickets/s', 'peak RSS MB', 'API calls/ticket')
+        with fakegithub.FakeGithub(latency=options.latency, rateLimit=10 ** 9) as fake:
+            fake.addRepo(_LOGIN, _REPO_NAME)
+            for stageName, stageFunction in _STAGES:
+                if options.stages and (stageName not in options.stages):
+                    continue
+                requestCountBefore = len(fake.requests)
+                # Run each stage in a new process so the peak RSS only includes this stage. Unlike the
+                # workers of a pool, this process may start processes to translate tickets.
+                resultConnection, stageConnection = multiprocessing.Pipe(False)
+                stageProcess = multiprocessing.Process(
+                    target=_measuredStage, args=(stageConnection, stageFunction, paths, options, fake.url))
+                stageProcess.start()
+                stageConnection.close()
+                try:
+                    ticketCount, duration, peakRss = resultConnection.recv()
+                except EOFError:
+                    raise SystemExit(u'stage failed: %s' % stageName)
+                finally:
+                    stageProcess.join()
+                requestCount = len(fake.requests) - requestCountBefore
+                apiCallsPerTicket = float(requestCount) / max(1, ticketCount)
+                ticketsPerSecond = ticketCount / duration if duration > 0 else 0.0
+                print '%-18s %10.2f %12.0f %12.1f %14.2f' % (
+                    stageName, duration, ticketsPerSecond, peakRss / 1024.0, apiCallsPerTicket)
+                results['stages'].append({
+                    'name': stageName,
+                    'seconds': duration,
+                    'ticketsPerSecond': ticketsPerSecond,
+                    'peakRssKilobytes': peakRss,
+                    'apiCalls': requestCount,
+                    'apiCallsPerTicket': apiCallsPerTicket,
+                })
+            results['writeCalls'] = fake.writeRequestCount()
+    finally:
+        shutil.rmtree(folder)
+    if options.report:
+        with open(options.report, 'wb') as reportFile:
+            json.dump(results, reportFile, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
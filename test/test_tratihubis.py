@@ -27,12 +27,23 @@ Tests for tratihubis.
 # CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
+import collections
+import csv
 import ConfigParser
 import github
+import json
 import logging
 import os.path
+import pickle
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 
+import benchmark_tratihubis
+import fakegithub
+import translator
 import tratihubis
 
 _TEST_CONFIG_PATHS = [
@@ -41,19 +52,38 @@ _TEST_CONFIG_PATHS = [
 ]
 
 
+_FAKE_LOGIN = 'roskakori'
+
+
+def _startFakeGithub(testCase, **keywords):
+    '''
+    Fake Github API with a repository ``tratihubis`` that stops when ``testCase`` has finished.
+    '''
+    result = fakegithub.FakeGithub(**keywords)
+    result.addRepo(_FAKE_LOGIN, 'tratihubis')
+    result.start()
+    testCase.addCleanup(result.stop)
+    return result
+
+
 class _HubbedTest(unittest.TestCase):
     '''
-    Like `unittest.TestCase` but with a `setUp()` that connects to Github and offers a ``hub`` property.
+    Like `unittest.TestCase` but with a `setUp()` that connects to Github and offers a ``hub``, ``token``
+    and ``baseUrl`` property. Without a ``token`` in section [tratihubis] in one of the files in
+    ``_TEST_CONFIG_PATHS``, it connects to a fake Github API available as ``fake``.
     '''
     def setUp(self):
         config = ConfigParser.SafeConfigParser()
         config.read(_TEST_CONFIG_PATHS)
-        if not config.has_section('tratihubis'):
-            raise ConfigParser.Error(u'test user and password must be specified in section [tratihubis] '
-                    + 'in one of the following files: %s' % _TEST_CONFIG_PATHS)
-        password = config.get('tratihubis', 'password')
-        user = config.get('tratihubis', 'user')
-        self.hub = github.Github(user, password)
+        if config.has_option('tratihubis', 'token'):
+            self.fake = None
+            self.baseUrl = None
+            self.token = config.get('tratihubis', 'token')
+        else:
+            self.fake = _startFakeGithub(self)
+            self.baseUrl = self.fake.url
+            self.token = _FAKE_LOGIN
+        self.hub = tratihubis._createHub(self.token, self.baseUrl)
 
 
 class _RepoedTest(_HubbedTest):
@@ -69,20 +99,21 @@ class _RepoedTest(_HubbedTest):
 class LabelTransformationTest(_RepoedTest):
     def testCanCreateSingleTransformation(self):
         transformations = tratihubis._LabelTransformations(self.repo, 'type=defect: bug')
-        self.assertEqual(transformations._transformations, [('type', 'defect', 'bug')])
+        self.assertEqual(transformations._fieldAndValueToLabelNameMap, {('type', 'defect'): 'bug'})
 
     def testCanCreateMultipleTransformation(self):
         transformations = tratihubis._LabelTransformations(self.repo,
                 'type=defect: bug, type=enhancement: enhancement, resolution=wontfix: wontfix')
-        self.assertEqual(transformations._transformations, [
-                ('type', 'defect', 'bug'),
-                ('type', 'enhancement', 'enhancement'),
-                ('resolution', 'wontfix', 'wontfix')
-        ])
+        self.assertEqual(transformations._fieldAndValueToLabelNameMap, {
+                ('type', 'defect'): 'bug',
+                ('type', 'enhancement'): 'enhancement',
+                ('resolution', 'wontfix'): 'wontfix'
+        })
+        self.assertEqual(transformations._fields, ['type', 'resolution'])
 
     def testCanCreateTransformationWithQuotedValue(self):
         transformations = tratihubis._LabelTransformations(self.repo, 'type="software defect": bug')
-        self.assertEqual(transformations._transformations, [('type', 'software defect', 'bug')])
+        self.assertEqual(transformations._fieldAndValueToLabelNameMap, {('type', 'software defect'): 'bug'})
 
     def testFailsOnNonExistentLabel(self):
         try:
@@ -92,35 +123,1169 @@ class LabelTransformationTest(_RepoedTest):
             self.assertTrue('unknown label' in unicode(error))
 
 
-class UserMapTest(_HubbedTest):
+_Label = collections.namedtuple('_Label', ['name', 'color'])
+
+
+class _LabelRepo(object):
+    def __init__(self, labelNames):
+        self.labels = [_Label(name, 'ffffff') for name in labelNames]
+        self.getLabelsCallCount = 0
+
+    def get_labels(self):
+        self.getLabelsCallCount += 1
+        return list(self.labels)
+
+    def create_label(self, name, color):
+        label = _Label(name, color)
+        self.labels.append(label)
+        return label
+
+
+class LabelCatalogueTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = _LabelRepo(['bug', 'wontfix'])
+        self.labelCatalogue = tratihubis._LabelCatalogue(tratihubis._RepoClients(self.repo))
+
+    def testCanListLabelsOnlyOnce(self):
+        self.assertEqual(self.repo.getLabelsCallCount, 0)
+        self.assertEqual(self.labelCatalogue.labelFor('bug').name, 'bug')
+        self.assertEqual(self.labelCatalogue.labelFor('no_such_label'), None)
+        self.assertEqual(self.labelCatalogue.labelNames(), ['bug', 'wontfix'])
+        self.assertEqual(self.repo.getLabelsCallCount, 1)
+
+    def testCanAddLabel(self):
+        self.assertEqual(self.labelCatalogue.addLabel('bug').color, 'ffffff')
+        self.assertEqual(len(self.repo.labels), 2)
+        self.assertEqual(self.labelCatalogue.addLabel('ui').name, 'ui')
+        self.assertEqual(self.labelCatalogue.addLabel('ui').name, 'ui')
+        self.assertEqual(len(self.repo.labels), 3)
+        self.assertEqual(self.labelCatalogue.labelFor('ui').name, 'ui')
+        self.assertEqual(self.repo.getLabelsCallCount, 1)
+
+    def testUsesRepoOfCurrentThread(self):
+        repoRequests = []
+        repo = self.repo
+
+        class ThreadClients(object):
+            def repoFor(self, token):
+                repoRequests.append((threading.current_thread().name, token))
+                return repo
+        labelCatalogue = tratihubis._LabelCatalogue(ThreadClients(), 'default')
+        thread = threading.Thread(target=labelCatalogue.addLabel, args=('ui', None, 'other'), name='worker')
+        thread.start()
+        thread.join()
+        self.assertEqual(repoRequests, [('worker', 'default'), ('worker', 'other')])
+        self.assertEqual(labelCatalogue.labelFor('ui').name, 'ui')
+
+    def testCanTransformWithLabelCatalogue(self):
+        transformations = tratihubis._LabelTransformations(self.repo, 'type=defect: bug', self.labelCatalogue)
+        self.assertEqual(transformations.labelFor('type', 'defect').name, 'bug')
+        self.assertEqual(transformations.labelFor('type', 'task'), None)
+        self.assertEqual(self.repo.getLabelsCallCount, 1)
+
+
+class LabelTransformationLookupTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = _LabelRepo(['bug', 'legacy', 'trac', 'ui'])
+
+    def _labelNameFor(self, definition, tracField, tracValue):
+        label = tratihubis._LabelTransformations(self.repo, definition).labelFor(tracField, tracValue)
+        return label.name if label is not None else None
+
+    def testCanTransformAnyValue(self):
+        self.assertEqual(self._labelNameFor('component=*: trac', 'component', 'core'), 'trac')
+        self.assertEqual(self._labelNameFor('component=*: trac', 'component', ''), None)
+        self.assertEqual(self._labelNameFor('component="*": trac', 'component', 'core'), None)
+
+    def testCanTransformPattern(self):
+        definition = 'component~"ui-.*": ui, component=*: trac'
+        self.assertEqual(self._labelNameFor(definition, 'component', 'ui-dialog'), 'ui')
+        self.assertEqual(self._labelNameFor(definition, 'component', 'core-ui-dialog'), 'trac')
+
+    def testPrefersSpecificValueOverPattern(self):
+        definition = 'component~"ui-.*": ui, component="ui-legacy": legacy, component="ui-legacy": trac'
+        self.assertEqual(self._labelNameFor(definition, 'component', 'ui-legacy'), 'legacy')
+
+    def testCanTransformAnyTextField(self):
+        transformations = tratihubis._LabelTransformations(self.repo,
+                'type=defect: bug, milestone=*: trac, owner=johndoe: trac')
+        ticketMap = {'type': u'defect', 'milestone': u'1.0', 'owner': u'johndoe'}
+        self.assertEqual([label.name for label in transformations.labelsFor(ticketMap)], ['bug', 'trac'])
+
+    def testFailsOnUnknownField(self):
+        self.assertRaises(tratihubis._ConfigError, tratihubis._LabelTransformations, self.repo, 'no_such_field=x: bug')
+
+    def testFailsOnBrokenPattern(self):
+        self.assertRaises(tratihubis._ConfigError, tratihubis._LabelTransformations, self.repo, 'type~"(": bug')
+
+
+class UserMapTest(_RepoedTest):
+    def setUp(self):
+        super(UserMapTest, self).setUp()
+        self.clients = tratihubis._GithubClients(self.repo, self.token, self.hub, self.baseUrl)
+
     def testCanCreateValidUserMap(self):
-        userMap = tratihubis._createTracToGithubUserMap(self.hub, 'hugo: sepp, *: roskakori')
+        userMap = tratihubis._createTracToGithubUserMap(self.clients, 'hugo: sepp, *: roskakori', self.token)
         self.assertEqual(userMap, {'*': 'roskakori', 'hugo': 'sepp'})
-        userMap = tratihubis._createTracToGithubUserMap(self.hub, '*:*')
-        self.assertEqual(userMap, {'*': '*'})
-        userMap = tratihubis._createTracToGithubUserMap(self.hub, ' * : * ')
-        self.assertEqual(userMap, {'*': '*'})
+        userMap = tratihubis._createTracToGithubUserMap(self.clients, '*:*', self.token)
+        self.assertEqual(userMap, {'*': self.token})
+        userMap = tratihubis._createTracToGithubUserMap(self.clients, ' * : * ', self.token)
+        self.assertEqual(userMap, {'*': self.token})
 
     def testFailsOnDuplicateUser(self):
         self.assertRaises(tratihubis._ConfigError, tratihubis._createTracToGithubUserMap,
-                self.hub, 'hugo: sepp, hugo: resi')
+                self.clients, 'hugo: sepp, hugo: resi', self.token)
+
+
+def _exportedTicketsCsvPath(testCase, legacyTicketsCsvPath):
+    '''
+    Path to a temporary copy of a tickets CSV in the layout of earlier versions of ``query_tickets.sql``,
+    which had a header and no times and component, in the current layout.
+    '''
+    with open(legacyTicketsCsvPath, 'rb') as legacyTicketsCsvFile:
+        rows = list(csv.reader(legacyTicketsCsvFile))[1:]
+    fileDescriptor, result = tempfile.mkstemp(suffix='.csv')
+    testCase.addCleanup(os.remove, result)
+    with os.fdopen(fileDescriptor, 'wb') as ticketsCsvFile:
+        csvWriter = csv.writer(ticketsCsvFile)
+        for row in rows:
+            csvWriter.writerow(row + ['1335902400', '1335902400', 'None'])
+    return result
 
 
 class TratihubisTest(_RepoedTest):
-    def _testCanConvertTicketsCsv(self, ticketsCsvPath, commentsCsvPath=None):
+    def _testCanConvertTicketsCsv(self, ticketsCsvPath, commentsCsvPath=None, attachmentsCsvPath=None):
         labelMapping = 'type=defect: bug, type=enhancement: enhancement, resolution=wontfix: wontfix'
-        userMapping = 'johndoe: roskakori, *: roskakori'
-        tratihubis.migrateTickets(self.hub, self.repo, ticketsCsvPath, commentsCsvPath,
-                userMapping=userMapping, labelMapping=labelMapping, pretend=True)
+        userMapping = 'johndoe: %s, *: %s' % (self.token, self.token)
+        tratihubis.migrateTickets(self.hub, self.repo, self.token, ticketsCsvPath, commentsCsvPath,
+                attachmentsCsvPath, userMapping=userMapping, labelMapping=labelMapping,
+                attachmentsPrefix='https://example.com/attachments', pretend=True, baseUrl=self.baseUrl)
 
     def testCanConvertTestTicketsCsv(self):
         self._testCanConvertTicketsCsv(
-                os.path.join('test', 'test_tickets.csv'),
-                os.path.join('test', 'test_comments.csv')
+                os.path.join('test', 'trac_tickets.csv'),
+                os.path.join('test', 'trac_comments.csv'),
+                os.path.join('test', 'trac_attachments.csv')
         )
 
     def testCanConvertCutplaceTicketsCsv(self):
-        self._testCanConvertTicketsCsv(os.path.join('test', 'cutplace_tickets.csv'))
+        self._testCanConvertTicketsCsv(_exportedTicketsCsvPath(self, os.path.join('test', 'cutplace_tickets.csv')))
+
+
+class SyntheticExportTest(unittest.TestCase):
+    def testCanReadSyntheticExport(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        ticketsCsvPath, commentsCsvPath, attachmentsCsvPath = \
+                benchmark_tratihubis.writeSyntheticExport(folder, 50, attachmentsPerTicket=0.5)
+        self.assertEqual(list(tratihubis._TracTicketSource(ticketsCsvPath).ticketIds()), range(1, 51))
+        self.assertEqual(len(list(tratihubis._TracTicketSource(ticketsCsvPath))), 50)
+        self.assertTrue(len(tratihubis._createTicketToCommentsMap(commentsCsvPath)) > 0)
+        self.assertTrue(len(tratihubis._createTicketsToAttachmentsMap(attachmentsCsvPath, 'https://example.com')) > 0)
+
+
+class FakeGithubMigrationTest(unittest.TestCase):
+    '''
+    Migrations that really create issues using a fake Github API.
+    '''
+    def setUp(self):
+        # Use a quota high enough for requests not to be spread until it resets.
+        self.fake = _startFakeGithub(self, rateLimit=1000000)
+        self.hub = tratihubis._createHub(_FAKE_LOGIN, self.fake.url)
+        self.repo = self.hub.get_user().get_repo('tratihubis')
+        self.fakeRepo = self.fake.repo('roskakori/tratihubis')
+
+    def _migrate(self, ticketsCsvPath=os.path.join('test', 'trac_tickets.csv'),
+                 commentsCsvPath=os.path.join('test', 'trac_comments.csv'), **keywords):
+        keywords.setdefault('pretend', False)
+        tratihubis.migrateTickets(self.hub, self.repo, _FAKE_LOGIN, ticketsCsvPath, commentsCsvPath,
+                os.path.join('test', 'trac_attachments.csv'),
+                labelMapping='type=defect: bug, type=enhancement: enhancement, resolution=wontfix: wontfix',
+                attachmentsPrefix='https://example.com/attachments', writeRate=1000, baseUrl=self.fake.url,
+                **keywords)
+
+    def testCanMigrateTickets(self):
+        self._migrate()
+        issues = self.fakeRepo.issues
+        self.assertEqual([issue['title'] for issue in issues],
+                [u'_Test defect with single line', u'_Test defect with multiple lines', u'_Test enhancement'])
+        self.assertEqual([issue['state'] for issue in issues], ['closed', 'closed', 'open'])
+        self.assertEqual([issue['labels'] for issue in issues], [['bug'], ['bug', 'wontfix'], ['enhancement']])
+        self.assertEqual([milestone['title'] for milestone in self.fakeRepo.milestones], [u'0.5.0', u'1'])
+        self.assertEqual(issues[0]['milestone'], 1)
+        self.assertEqual([len(self.fakeRepo.comments[number]) for number in (1, 2, 3)], [3, 0, 1])
+
+    def testCanCreateMilestonesBeforeIssues(self):
+        self._migrate(milestonesCsvPath=os.path.join('test', 'trac_milestones.csv'))
+        milestones = self.fakeRepo.milestones
+        self.assertEqual([milestone['title'] for milestone in milestones], [u'0.5.0', u'1'])
+        self.assertEqual([milestone['state'] for milestone in milestones], ['closed', 'open'])
+        self.assertEqual(milestones[0]['due_on'], '2012-05-02T23:06:40Z')
+        self.assertEqual(milestones[0]['description'], u'First public release')
+        self.assertEqual(milestones[1]['description'], None)
+        postPaths = [request.path for request in self.fake.requests if request.method == 'POST']
+        self.assertTrue(postPaths[0].endswith('/milestones'))
+        self.assertTrue(postPaths[1].endswith('/milestones'))
+        self.assertTrue(postPaths[2].endswith('/issues'))
+
+    def testCanCombineWrites(self):
+        self._migrate()
+        separateWriteCount = self.fake.writeRequestCount()
+        self.fake.addRepo('roskakori', 'tratihubis')
+        self.fake.requests = []
+        self.repo = self.hub.get_user().get_repo('tratihubis')
+        self.fakeRepo = self.fake.repo('roskakori/tratihubis')
+        self._migrate(combineWrites=True)
+        self.assertEqual([issue['labels'] for issue in self.fakeRepo.issues],
+                [['bug'], ['bug', 'wontfix'], ['enhancement']])
+        self.assertEqual(self.fake.requestCount('PATCH'), 2)
+        self.assertEqual(self.fake.writeRequestCount(), separateWriteCount - 3)
+
+    def testCanCombineWritesWithoutPushAccessOfReporter(self):
+        self.fakeRepo.pushLogins = [_FAKE_LOGIN]
+        self._migrate(userMapping='roskakori: crashfest, *: roskakori', combineWrites=True, assignOwners=True)
+        issues = self.fakeRepo.issues
+        self.assertEqual([issue['user'] for issue in issues], ['crashfest'] * 3)
+        self.assertEqual([issue['labels'] for issue in issues], [['bug'], ['bug', 'wontfix'], ['enhancement']])
+        self.assertEqual([issue['assignee'] for issue in issues], [_FAKE_LOGIN, 'crashfest', 'crashfest'])
+
+    def testCanResolveEachUserOnce(self):
+        self.fake.requests = []
+        self._migrate(userMapping='crashfest: crashfest, *: roskakori', workerCount=2)
+        self.assertEqual(len(self.fakeRepo.issues), 3)
+        self.assertEqual(self.fake.requestCount('GET', '^/user$'), 2)
+        self.assertEqual([comment['user']['login'] for comment in self.fakeRepo.comments[1]],
+                [_FAKE_LOGIN, 'crashfest', _FAKE_LOGIN])
+
+    def testBuildsWritesOnWorkers(self):
+        threadNames = []
+
+        class ThreadNameHandler(logging.Handler):
+            def emit(self, record):
+                if record.getMessage().startswith(u'  add comment by'):
+                    threadNames.append(record.threadName)
+
+        handler = ThreadNameHandler()
+        tratihubis._log.addHandler(handler)
+        self.addCleanup(tratihubis._log.removeHandler, handler)
+        self.addCleanup(tratihubis._log.setLevel, tratihubis._log.level)
+        tratihubis._log.setLevel(logging.INFO)
+        self._migrate(workerCount=2)
+        self.assertEqual(len(threadNames), 3)
+        self.assertNotIn(threading.current_thread().name, threadNames)
+
+    def testCreatesLabelsOnTokenQueues(self):
+        threadNames = []
+
+        class ThreadNameHandler(logging.Handler):
+            def emit(self, record):
+                if record.getMessage().startswith(u'  create label'):
+                    threadNames.append(record.threadName)
+
+        handler = ThreadNameHandler()
+        tratihubis._log.addHandler(handler)
+        self.addCleanup(tratihubis._log.removeHandler, handler)
+        self.addCleanup(tratihubis._log.setLevel, tratihubis._log.level)
+        tratihubis._log.setLevel(logging.INFO)
+        self._migrate(workerCount=2, tokenQueues=True, addComponentLabels=True)
+        self.assertTrue(threadNames)
+        self.assertTrue(all(threadName.startswith('tratihubis-queue-') for threadName in threadNames), threadNames)
+        self.assertEqual(self.fakeRepo.issues[0]['labels'], ['bug', 'core'])
+
+    def testCanWriteOnTokenQueues(self):
+        self._migrate(userMapping='crashfest: crashfest, *: roskakori', workerCount=2, tokenQueues=True)
+        issues = self.fakeRepo.issues
+        self.assertEqual([issue['state'] for issue in issues], ['closed', 'closed', 'open'])
+        self.assertEqual([issue['labels'] for issue in issues], [['bug'], ['bug', 'wontfix'], ['enhancement']])
+        self.assertEqual([comment['user']['login'] for comment in self.fakeRepo.comments[1]],
+                [_FAKE_LOGIN, 'crashfest', _FAKE_LOGIN])
+        self.assertTrue(self.fakeRepo.comments[1][0]['body'].startswith(u'_crashfest attached'))
+
+    def testFailsOnUnmappedUserBeforeWriting(self):
+        self.assertRaises(tratihubis._ConfigError, self._migrate, userMapping='roskakori: roskakori')
+        self.assertEqual(self.fake.writeRequestCount(), 0)
+
+    def testRemovesTemporaryCommentDatabaseOnError(self):
+        tempFolder = tempfile.mkdtemp(prefix='tratihubis_test_')
+        self.addCleanup(shutil.rmtree, tempFolder)
+        commentsCsvPath = os.path.join(tempFolder, 'comments.csv')
+        with open(commentsCsvPath, 'wb') as commentsCsvFile:
+            csv.writer(commentsCsvFile).writerows([
+                ['3', '1335910600', 'fanboy', 'This feature would be nice.'],
+                ['1', '1335903400', 'crashfest', 'This does not work!'],
+            ])
+        self.addCleanup(setattr, tempfile, 'tempdir', tempfile.tempdir)
+        tempfile.tempdir = tempFolder
+        # Unsorted comments are indexed in a temporary database before the unmapped users are found.
+        self.assertRaises(tratihubis._ConfigError, self._migrate, commentsCsvPath=commentsCsvPath,
+                userMapping='roskakori: roskakori')
+        self.assertEqual(os.listdir(tempFolder), ['comments.csv'])
+
+    def testValidatesOnlyUsersOfConvertedTickets(self):
+        # Comments and attachments of ticket 1 are by crashfest, the comment of ticket 3 by fanboy.
+        self._migrate(userMapping='roskakori: roskakori', firstTicketIdToConvert=2, lastTicketIdToConvert=2)
+        self.assertEqual([issue['title'] for issue in self.fakeRepo.issues], [u'_Test defect with multiple lines'])
+
+    def testCanImportIssues(self):
+        self._migrate(writer='import')
+        issues = self.fakeRepo.issues
+        self.assertEqual([issue['title'] for issue in issues],
+                [u'_Test defect with single line', u'_Test defect with multiple lines', u'_Test enhancement'])
+        self.assertEqual([issue['state'] for issue in issues], ['closed', 'closed', 'open'])
+        self.assertEqual([issue['labels'] for issue in issues], [['bug'], ['bug', 'wontfix'], ['enhancement']])
+        self.assertEqual(issues[0]['milestone'], 1)
+        self.assertEqual(issues[0]['created_at'], tratihubis._isoTime(1335902400))
+        self.assertEqual(issues[0]['closed_at'], tratihubis._isoTime(1335988800))
+        comments = self.fakeRepo.comments[1]
+        self.assertEqual([len(self.fakeRepo.comments[number]) for number in (1, 2, 3)], [3, 0, 1])
+        self.assertEqual([comment['created_at'] for comment in comments],
+                sorted(comment['created_at'] for comment in comments))
+        self.assertTrue(comments[0]['body'].startswith(u'_crashfest attached [screenshot.png]'))
+        self.assertEqual(self.fake.requestCount('POST', '/import/issues$'), 3)
+        self.assertEqual(self.fake.requestCount('POST', '/comments$'), 0)
+        self.assertEqual(self.fake.requestCount('PATCH'), 0)
+
+    def testCanWaitForInterruptedImports(self):
+        journalPath = os.path.join(tempfile.mkdtemp(prefix='tratihubis_test_'), 'tratihubis.journal')
+        self.addCleanup(shutil.rmtree, os.path.dirname(journalPath))
+        self.fake.failNext(method='GET', path='/import/issues/')
+        self.assertRaises(github.GithubException, self._migrate, writer='import', journalPath=journalPath)
+        self.assertEqual(len(self.fakeRepo.imports), 3)
+        self._migrate(writer='import', journalPath=journalPath)
+        self.assertEqual(len(self.fakeRepo.imports), 3)
+        self.assertEqual(len(self.fakeRepo.issues), 3)
+        # Once the imports are finished, nothing is left to do.
+        writeRequestCount = self.fake.writeRequestCount()
+        self._migrate(writer='import', journalPath=journalPath)
+        self.assertEqual(self.fake.writeRequestCount(), writeRequestCount)
+
+    def testCanImportAgainAfterRejectedImport(self):
+        journalPath = os.path.join(tempfile.mkdtemp(prefix='tratihubis_test_'), 'tratihubis.journal')
+        self.addCleanup(shutil.rmtree, os.path.dirname(journalPath))
+        self.fakeRepo.importFailureCount = 1
+        self.assertRaises(tratihubis._ImportError, self._migrate, writer='import', journalPath=journalPath)
+        self._migrate(writer='import', journalPath=journalPath)
+        self.assertEqual(len(self.fakeRepo.imports), 4)
+        self.assertEqual(sorted(issue['title'] for issue in self.fakeRepo.issues),
+                [u'_Test defect with multiple lines', u'_Test defect with single line', u'_Test enhancement'])
+
+    def testCanResumeImportIntoRepoWithNewerPullRequest(self):
+        journalPath = os.path.join(tempfile.mkdtemp(prefix='tratihubis_test_'), 'tratihubis.journal')
+        self.addCleanup(shutil.rmtree, os.path.dirname(journalPath))
+        self.fakeRepo.addIssue(u'pull request opened before the migration')
+        self._migrate(writer='import', journalPath=journalPath, lastTicketIdToConvert=2)
+        # Imported issues keep the creation time of their ticket and so appear older than the pull request.
+        self.assertEqual(tratihubis._highestIssueNumber(self.repo), 1)
+        warnings = []
+
+        class WarningHandler(logging.Handler):
+            def emit(self, record):
+                if record.levelno == logging.WARNING:
+                    warnings.append(record.getMessage())
+
+        handler = WarningHandler()
+        tratihubis._log.addHandler(handler)
+        self.addCleanup(tratihubis._log.removeHandler, handler)
+        self._migrate(writer='import', journalPath=journalPath)
+        self.assertEqual(warnings, [])
+        self.assertEqual([issue['title'] for issue in self.fakeRepo.issues], [
+                u'pull request opened before the migration', u'_Test defect with single line',
+                u'_Test defect with multiple lines', u'_Test enhancement'])
+
+    def testFailsOnRejectedImport(self):
+        clients = tratihubis._GithubClients(self.repo, _FAKE_LOGIN, self.hub, self.fake.url)
+        journal = tratihubis._MigrationJournal(None, 'roskakori/tratihubis')
+        ticketsToIssuesMap = {1: 1}
+        importer = tratihubis._IssueImporter(clients, tratihubis._RequestScheduler(clients, rate=1000), _FAKE_LOGIN,
+                journal, ticketsToIssuesMap)
+        ticketMap = tratihubis._TracTicketSource(os.path.join('test', 'trac_tickets.csv')).ticketMapFor(1)
+        importer.submit(1, tratihubis._issueImportPayload(ticketMap, u'', u'body'), 1, [])
+        self.assertRaises(tratihubis._ImportError, importer.close)
+        self.assertEqual(journal.issueNumberFor(1), None)
+
+    def testCanMigrateFromTracDatabase(self):
+        tempFolder = tempfile.mkdtemp(prefix='tratihubis_test_')
+        self.addCleanup(shutil.rmtree, tempFolder)
+        databasePath = os.path.join(tempFolder, 'trac.db')
+        benchmark_tratihubis.writeTracDatabase(databasePath, os.path.join('test', 'trac_tickets.csv'),
+                os.path.join('test', 'trac_comments.csv'), os.path.join('test', 'trac_attachments.csv'))
+        tracDatabase = tratihubis._TracDatabase('sqlite:' + databasePath)
+        self.addCleanup(tracDatabase.close)
+        self._migrate(ticketsCsvPath=None, commentsCsvPath=None, tracDatabase=tracDatabase)
+        issues = self.fakeRepo.issues
+        self.assertEqual([issue['title'] for issue in issues],
+                [u'_Test defect with single line', u'_Test defect with multiple lines', u'_Test enhancement'])
+        self.assertEqual([issue['state'] for issue in issues], ['closed', 'closed', 'open'])
+        self.assertEqual([len(self.fakeRepo.comments[number]) for number in (1, 2, 3)], [3, 0, 1])
+
+    def testCanFindHighestIssueNumber(self):
+        self.assertEqual(tratihubis._highestIssueNumber(self.repo), 0)
+        for number in range(1, 76):
+            self.fakeRepo.addIssue(u'issue %d' % number, state='closed' if number % 3 == 0 else 'open')
+        self.fake.requests = []
+        self.assertEqual(tratihubis._highestIssueNumber(self.repo), 75)
+        self.assertEqual(self.fake.requestCount('GET', '/issues$'), 1)
+        existingIssues = tratihubis._createIssueMap(self.repo)
+        self.assertEqual(len(existingIssues), 75)
+        self.assertEqual(existingIssues[3], tratihubis._ExistingIssue(3, u'issue 3', 'closed'))
+
+    def testCanSyncChangedTickets(self):
+        tempFolder = tempfile.mkdtemp(prefix='tratihubis_test_')
+        self.addCleanup(shutil.rmtree, tempFolder)
+        journalPath = os.path.join(tempFolder, 'tratihubis.journal')
+        ticketsCsvPath = os.path.join(tempFolder, 'tickets.csv')
+        commentsCsvPath = os.path.join(tempFolder, 'comments.csv')
+        shutil.copy(os.path.join('test', 'trac_tickets.csv'), ticketsCsvPath)
+        shutil.copy(os.path.join('test', 'trac_comments.csv'), commentsCsvPath)
+        self._migrate(ticketsCsvPath, commentsCsvPath, journalPath=journalPath, sync=True)
+        self.assertEqual([issue['state'] for issue in self.fakeRepo.issues], ['closed', 'closed', 'open'])
+
+        # Reopen ticket 2, close ticket 3 as wontfix and comment on it.
+        with open(ticketsCsvPath, 'rb') as ticketsCsvFile:
+            ticketRows = list(csv.reader(ticketsCsvFile))
+        ticketRows[1][5:7] = ['reopened', '']
+        ticketRows[2][5:7] = ['closed', 'wontfix']
+        modifiedTime = str(max(int(ticketRow[10]) for ticketRow in ticketRows) + 86400)
+        ticketRows[1][10] = modifiedTime
+        ticketRows[2][10] = modifiedTime
+        with open(ticketsCsvPath, 'wb') as ticketsCsvFile:
+            csv.writer(ticketsCsvFile).writerows(ticketRows)
+        with open(commentsCsvPath, 'ab') as commentsCsvFile:
+            csv.writer(commentsCsvFile).writerow([3, modifiedTime, 'roskakori', "Won't fix."])
+        self.fake.requests = []
+        self._migrate(ticketsCsvPath, commentsCsvPath, journalPath=journalPath, sync=True)
+        issues = self.fakeRepo.issues
+        self.assertEqual([issue['state'] for issue in issues], ['closed', 'open', 'closed'])
+        self.assertEqual(issues[1]['labels'], ['bug'])
+        self.assertEqual(issues[2]['labels'], ['enhancement', 'wontfix'])
+        self.assertEqual(len(self.fakeRepo.comments[3]), 2)
+        self.assertEqual(self.fake.requestCount('POST', '/issues$'), 0)
+        self.assertEqual(self.fake.writeRequestCount(), 5)
+
+        # Without further changes, synchronizing again writes nothing.
+        self.fake.requests = []
+        self._migrate(ticketsCsvPath, commentsCsvPath, journalPath=journalPath, sync=True)
+        self.assertEqual(self.fake.writeRequestCount(), 0)
+
+        # Pretending to synchronize again reports no changes either.
+        updates = []
+
+        class UpdateHandler(logging.Handler):
+            def emit(self, record):
+                if record.getMessage().startswith(u'  update labels'):
+                    updates.append(record.getMessage())
+
+        handler = UpdateHandler()
+        tratihubis._log.addHandler(handler)
+        self.addCleanup(tratihubis._log.removeHandler, handler)
+        self.addCleanup(tratihubis._log.setLevel, tratihubis._log.level)
+        tratihubis._log.setLevel(logging.INFO)
+        self._migrate(ticketsCsvPath, commentsCsvPath, journalPath=journalPath, sync=True, pretend=True)
+        self.assertEqual(updates, [])
+        self.assertEqual(self.fake.writeRequestCount(), 0)
+
+    def testCanRetryAfterSecondaryRateLimit(self):
+        self.fake.failNextWithSecondaryRateLimit(method='POST', path='/issues$', retryAfter=1)
+        sleeps = []
+        scheduler = tratihubis._RequestScheduler(tratihubis._GithubClients(self.repo, _FAKE_LOGIN, self.hub),
+                sleep=sleeps.append)
+        issue = scheduler.call(_FAKE_LOGIN, self.repo.create_issue, u'some title')
+        self.assertEqual(issue.number, 1)
+        self.assertEqual(scheduler.retryCount, 1)
+        self.assertEqual(sleeps, [1.0])
+        self.assertEqual(self.fake.requestCount('POST', '/issues$'), 2)
+
+    def testDoesNotRequestQuotaOfNewClients(self):
+        clients = tratihubis._GithubClients(self.repo, _FAKE_LOGIN, self.hub, self.fake.url)
+        scheduler = tratihubis._RequestScheduler(clients, rate=1000)
+        self.fake.requests = []
+        scheduler.call('crashfest', lambda: None)
+        self.assertEqual(self.fake.requestCount('GET', '/rate_limit'), 0)
+
+    def testCanMigrateWithMain(self):
+        fileDescriptor, configPath = tempfile.mkstemp(suffix='.cfg')
+        self.addCleanup(os.remove, configPath)
+        journalPath = configPath + '.journal'
+        self.addCleanup(lambda: os.path.exists(journalPath) and os.remove(journalPath))
+        with os.fdopen(fileDescriptor, 'wb') as configFile:
+            configFile.write('\n'.join([
+                '[tratihubis]',
+                'token = %s' % _FAKE_LOGIN,
+                'repo = tratihubis',
+                'tickets = %s' % os.path.join('test', 'trac_tickets.csv'),
+                'comments = %s' % os.path.join('test', 'trac_comments.csv'),
+                'base_url = %s' % self.fake.url,
+                'journal = %s' % journalPath,
+                'write_rate = 1000',
+            ]))
+        self.assertEqual(tratihubis.main(['tratihubis', '--really', configPath]), 0)
+        self.assertEqual(len(self.fakeRepo.issues), 3)
+        # Running again resumes from the journal and creates nothing new.
+        writeRequestCount = self.fake.writeRequestCount()
+        self.assertEqual(tratihubis.main(['tratihubis', '--really', configPath]), 0)
+        self.assertEqual(len(self.fakeRepo.issues), 3)
+        self.assertEqual(self.fake.writeRequestCount(), writeRequestCount)
+
+    def testCanWriteReportWithMain(self):
+        fileDescriptor, configPath = tempfile.mkstemp(suffix='.cfg')
+        self.addCleanup(os.remove, configPath)
+        reportPath = configPath + '.json'
+        self.addCleanup(lambda: os.path.exists(reportPath) and os.remove(reportPath))
+        with os.fdopen(fileDescriptor, 'wb') as configFile:
+            configFile.write('\n'.join([
+                '[tratihubis]',
+                'token = %s' % _FAKE_LOGIN,
+                'repo = tratihubis',
+                'tickets = %s' % os.path.join('test', 'trac_tickets.csv'),
+                'comments = %s' % os.path.join('test', 'trac_comments.csv'),
+                'base_url = %s' % self.fake.url,
+                'journal = %s' % (configPath + '.journal'),
+                'write_rate = 1000',
+                'report = %s' % reportPath,
+            ]))
+        self.addCleanup(os.remove, configPath + '.journal')
+        self.assertEqual(tratihubis.main(['tratihubis', '--really', configPath]), 0)
+        with open(reportPath, 'rb') as reportFile:
+            report = json.load(reportFile)
+        self.assertEqual(report['exitCode'], 0)
+        self.assertEqual(report['counters']['createdIssues'], 3)
+        self.assertEqual(report['stages']['create issue']['count'], 3)
+        self.assertEqual(report['apiCalls']['POST /repos/:owner/:repo/issues']['count'], 3)
+        self.assertEqual(report['apiCalls']['POST /repos/:owner/:repo/issues/:number/comments']['count'], 3)
+        self.assertEqual(report['writeRequestCount'], self.fake.writeRequestCount())
+
+    def _plan(self, planName='tratihubis.plan', **keywords):
+        folder = tempfile.mkdtemp(prefix='tratihubis_test_')
+        self.addCleanup(shutil.rmtree, folder)
+        planPath = os.path.join(folder, planName)
+        tratihubis.planMigration(planPath, 'tratihubis', os.path.join('test', 'trac_tickets.csv'),
+                os.path.join('test', 'trac_comments.csv'), os.path.join('test', 'trac_attachments.csv'),
+                labelMapping='type=defect: bug, type=enhancement: enhancement, resolution=wontfix: wontfix',
+                attachmentsPrefix='https://example.com/attachments', **keywords)
+        return planPath
+
+    def _executePlan(self, planPath, **keywords):
+        tratihubis.executePlan(self.hub, self.repo, _FAKE_LOGIN, planPath, pretend=False, writeRate=1000,
+                baseUrl=self.fake.url, **keywords)
+
+    def testCanPlanMigration(self):
+        self.fake.requests = []
+        planPath = self._plan('tratihubis.plan.gz', milestonesCsvPath=os.path.join('test', 'trac_milestones.csv'))
+        self.assertEqual(self.fake.requests, [])
+        self.assertEqual(tratihubis._planHeader(planPath)['highestIssueNumber'], 0)
+        steps = list(tratihubis._planSteps(planPath))
+        self.assertEqual([step['step'] for step in steps if step['step'] in ('milestone', 'label')],
+                ['milestone', 'milestone', 'label', 'label', 'label'])
+        issueSteps = [step for step in steps if step['step'] == 'issue']
+        self.assertEqual([step['issue'] for step in issueSteps], [1, 2, 3])
+        self.assertEqual(issueSteps[1]['labels'], ['bug', 'wontfix'])
+        self.assertEqual([step['step'] for step in steps if step.get('ticket') == issueSteps[0]['ticket']],
+                ['issue', 'attachment', 'comment', 'comment', 'closed'])
+
+    def testCanExecutePlan(self):
+        planPath = self._plan()
+        self._executePlan(planPath)
+        issues = self.fakeRepo.issues
+        self.assertEqual([issue['title'] for issue in issues],
+                [u'_Test defect with single line', u'_Test defect with multiple lines', u'_Test enhancement'])
+        self.assertEqual([issue['state'] for issue in issues], ['closed', 'closed', 'open'])
+        self.assertEqual([issue['labels'] for issue in issues], [['bug'], ['bug', 'wontfix'], ['enhancement']])
+        self.assertEqual(issues[0]['milestone'], 1)
+        self.assertEqual([len(self.fakeRepo.comments[number]) for number in (1, 2, 3)], [3, 0, 1])
+        self.assertTrue(self.fakeRepo.comments[1][0]['body'].startswith(u'_crashfest attached'))
+
+    def testCanExecutePlanWithoutPushAccessOfReporter(self):
+        self.fakeRepo.pushLogins = [_FAKE_LOGIN]
+        planPath = self._plan(assignOwners=True)
+        self._executePlan(planPath, userMapping='roskakori: crashfest, *: roskakori')
+        issues = self.fakeRepo.issues
+        self.assertEqual([issue['labels'] for issue in issues], [['bug'], ['bug', 'wontfix'], ['enhancement']])
+        self.assertEqual([issue['assignee'] for issue in issues], [_FAKE_LOGIN, 'crashfest', 'crashfest'])
+
+    def testCanResumeExecutionOfPlan(self):
+        planPath = self._plan()
+        journalPath = planPath + '.journal'
+        self.fake.failNext(method='POST', path='/comments$')
+        self.assertRaises(github.GithubException, self._executePlan, planPath, journalPath=journalPath)
+        self._executePlan(planPath, journalPath=journalPath, tokenQueues=True)
+        self.assertEqual(len(self.fakeRepo.issues), 3)
+        self.assertEqual([len(self.fakeRepo.comments[number]) for number in (1, 2, 3)], [3, 0, 1])
+
+    def testFailsOnPlanForOtherIssueNumbers(self):
+        planPath = self._plan(highestIssueNumber=5)
+        self.assertRaises(tratihubis._PlanError, self._executePlan, planPath)
+        self.assertEqual(self.fake.writeRequestCount(), 0)
+
+    def testCanPlanWithMainWithoutToken(self):
+        fileDescriptor, configPath = tempfile.mkstemp(suffix='.cfg')
+        self.addCleanup(os.remove, configPath)
+        planPath = configPath + '.plan'
+        self.addCleanup(lambda: os.path.exists(planPath) and os.remove(planPath))
+        with os.fdopen(fileDescriptor, 'wb') as configFile:
+            configFile.write('\n'.join([
+                '[tratihubis]',
+                'repo = tratihubis',
+                'tickets = %s' % os.path.join('test', 'trac_tickets.csv'),
+                'comments = %s' % os.path.join('test', 'trac_comments.csv'),
+                'base_url = http://127.0.0.1:1',
+                'existing_issues = 7',
+            ]))
+        self.assertEqual(tratihubis.main(['tratihubis', '--plan', planPath, configPath]), 0)
+        self.assertEqual([step['issue'] for step in tratihubis._planSteps(planPath) if step['step'] == 'issue'],
+                [8, 9, 10])
+
+
+class InstrumentationTest(unittest.TestCase):
+    def testCanNameApiEndpoints(self):
+        self.assertEqual(tratihubis._apiEndpoint('POST', 'https://api.github.com/repos/roskakori/tratihubis/issues'),
+                u'POST /repos/:owner/:repo/issues')
+        self.assertEqual(tratihubis._apiEndpoint('PATCH', 'https://example.com/api/v3/repos/a/b/issues/17?x=1'),
+                u'PATCH /repos/:owner/:repo/issues/:number')
+        self.assertEqual(tratihubis._apiEndpoint('GET', 'https://api.github.com/repos/a/b/labels/help%20wanted'),
+                u'GET /repos/:owner/:repo/labels/:name')
+        self.assertEqual(tratihubis._apiEndpoint('GET', 'https://api.github.com/users/roskakori'),
+                u'GET /users/:login')
+
+    def testWarnsIfHubCannotBeInstrumented(self):
+        warnings = []
+
+        class WarningHandler(logging.Handler):
+            def emit(self, record):
+                if record.levelno == logging.WARNING:
+                    warnings.append(record.getMessage())
+
+        handler = WarningHandler()
+        tratihubis._log.addHandler(handler)
+        self.addCleanup(tratihubis._log.removeHandler, handler)
+        tratihubis._instrumentHub(object(), tratihubis._Instrumentation())
+        self.assertEqual(len(warnings), 1)
+        self.assertTrue(warnings[0].startswith(u'cannot time API calls'))
+
+    def testCanComputeTimingStatistics(self):
+        statistics = tratihubis._TimingStatistics()
+        for seconds in [0.003] * 9 + [1.5]:
+            statistics.add(seconds)
+        statistics.add(0.04, isError=True)
+        self.assertEqual(statistics.count, 11)
+        self.assertEqual(statistics.errorCount, 1)
+        self.assertEqual(statistics.percentile(0.5), 0.005)
+        self.assertEqual(statistics.percentile(1.0), 1.5)
+        self.assertEqual(statistics.toJson()['histogram'], [
+            {'maxSeconds': 0.005, 'count': 9}, {'maxSeconds': 0.05, 'count': 1}, {'maxSeconds': 2.0, 'count': 1}])
+
+    def testCanTimeStages(self):
+        instrumentation = tratihubis._Instrumentation()
+        self.assertEqual(list(instrumentation.timedItems('read', [1, 2, 3])), [1, 2, 3])
+        with instrumentation.timed('write'):
+            pass
+        instrumentation.count('tickets', 2)
+        report = instrumentation.report(exitCode=0)
+        self.assertEqual(report['stages']['read']['count'], 3)
+        self.assertEqual(report['stages']['write']['count'], 1)
+        self.assertEqual(report['counters'], {'tickets': 2})
+        self.assertEqual(report['exitCode'], 0)
+
+    def testCanReportProgress(self):
+        times = [100.0]
+        progress = tratihubis._ProgressReporter(100, 10, now=lambda: times[0])
+        times[0] = 160.0
+        self.assertEqual(progress.progressText(25),
+                u'processed 25 of 100 tickets (25%), 25.0 tickets per minute, remaining time 0:03:00')
+
+
+class IssueImportPayloadTest(unittest.TestCase):
+    def testCanBuildPayload(self):
+        ticketMap = tratihubis._TracTicketSource(os.path.join('test', 'trac_tickets.csv')).ticketMapFor(1)
+        payload = tratihubis._issueImportPayload(ticketMap, u'title', u'body', ['bug'], 2, 'johndoe',
+                [(1335905000, u'later'), (1335903000, u'earlier')])
+        self.assertEqual(payload['issue'], {
+            'title': u'title',
+            'body': u'body',
+            'created_at': '2012-05-01T20:00:00Z',
+            'updated_at': '2012-05-02T20:00:00Z',
+            'closed': True,
+            'closed_at': '2012-05-02T20:00:00Z',
+            'labels': ['bug'],
+            'milestone': 2,
+            'assignee': 'johndoe',
+        })
+        self.assertEqual(payload['comments'], [
+            {'created_at': '2012-05-01T20:10:00Z', 'body': u'earlier'},
+            {'created_at': '2012-05-01T20:43:20Z', 'body': u'later'}])
+
+
+class _QuotaHub(object):
+    def __init__(self, remaining=5000, resetTime=None):
+        self.rate_limiting = (remaining, 5000)
+        self.rate_limiting_resettime = resetTime if resetTime is not None else time.time() + 3600
+
+
+class _QuotaClients(object):
+    def __init__(self, hub):
+        self.hub = hub
+
+    def hubFor(self, token):
+        return self.hub
+
+
+class RequestSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.sleeps = []
+        self.hub = _QuotaHub()
+        self.scheduler = tratihubis._RequestScheduler(
+                _QuotaClients(self.hub), rate=1000, maxRetryCount=2, backoff=10, sleep=self.sleeps.append)
+
+    def testCanCallFunction(self):
+        self.assertEqual(self.scheduler.call('token', lambda x, y=0: x + y, 1, y=2), 3)
+        self.assertEqual(self.scheduler.requestCount, 1)
+
+    def testCanRetryAfterSecondaryRateLimit(self):
+        results = [github.GithubException(403, {'message': 'You have triggered an abuse detection mechanism.'})]
+
+        def createIssue():
+            if results:
+                raise results.pop()
+            return 'issue'
+        self.assertEqual(self.scheduler.call('token', createIssue), 'issue')
+        self.assertEqual(self.scheduler.retryCount, 1)
+        self.assertTrue(10 in self.sleeps)
+
+    def testFailsOnOtherErrors(self):
+        def createIssue():
+            raise github.GithubException(403, {'message': 'Must have admin rights to Repository.'})
+        self.assertRaises(github.GithubException, self.scheduler.call, 'token', createIssue)
+        self.assertEqual(self.scheduler.retryCount, 0)
+
+    def testFailsAfterTooManyRetries(self):
+        def createIssue():
+            raise github.GithubException(429, {'message': 'Too many requests'})
+        self.assertRaises(github.GithubException, self.scheduler.call, 'token', createIssue)
+        self.assertEqual(self.scheduler.retryCount, 2)
+
+    def testCanWaitForExhaustedQuota(self):
+        self.hub.rate_limiting = (0, 5000)
+        self.hub.rate_limiting_resettime = time.time() + 100
+        self.scheduler.call('token', lambda: None)
+        self.assertTrue(self.sleeps)
+        self.assertTrue(self.sleeps[0] > 90)
+
+    def testKeepsRateWhileQuotaIsHigh(self):
+        self.scheduler.call('token', lambda: None)
+        self.assertEqual(self.scheduler._bucketFor('token').rate, 1000)
+
+    def testCanSlowDownWhenQuotaIsLow(self):
+        self.hub.rate_limiting = (100, 5000)
+        self.hub.rate_limiting_resettime = time.time() + 1000
+        self.scheduler.call('token', lambda: None)
+        self.assertAlmostEqual(self.scheduler._bucketFor('token').rate, 0.1, places=2)
+
+    def testIgnoresUnknownQuota(self):
+        self.hub.rate_limiting = (-1, -1)
+        self.hub.rate_limiting_resettime = 0
+        self.assertEqual(self.scheduler._quotaFor('token'), (None, None))
+
+    def testCanPaceRequests(self):
+        bucket = tratihubis._TokenBucket(2, 1, sleep=self.sleeps.append)
+        bucket.acquire()
+        bucket.acquire()
+        self.assertEqual(len(self.sleeps), 1)
+        self.assertAlmostEqual(self.sleeps[0], 0.5, places=1)
+
+
+class TokenQueuesTest(unittest.TestCase):
+    def setUp(self):
+        self.queues = tratihubis._TokenQueues(workerCount=2)
+        self.addCleanup(self.queues.close)
+
+    def testCanKeepOrderOfWritesAcrossTokens(self):
+        issueToWritesMap = collections.defaultdict(list)
+
+        def write(issueNumber, writeIndex):
+            if writeIndex % 2 == 0:
+                time.sleep(0.001)
+            issueToWritesMap[issueNumber].append(writeIndex)
+        for issueNumber in range(10):
+            self.queues.submit([(token, lambda issueNumber=issueNumber, writeIndex=writeIndex: write(
+                    issueNumber, writeIndex)) for writeIndex, token in enumerate(['a', 'b', 'a', 'c', 'b'])])
+        self.queues.close()
+        self.assertEqual(dict(issueToWritesMap), dict((issueNumber, range(5)) for issueNumber in range(10)))
+        self.assertEqual(self.queues.writeCounts, {'a': 20, 'b': 20, 'c': 10})
+
+    def testCanWriteForDifferentTokensInParallel(self):
+        written = threading.Event()
+        waited = []
+        self.queues = tratihubis._TokenQueues(workerCount=1)
+        self.queues.submit([('a', lambda: waited.append(written.wait(5)))])
+        self.queues.submit([('b', written.set)])
+        self.queues.close()
+        self.assertEqual(waited, [True])
+
+    def testFailsOnWriteError(self):
+        writes = []
+
+        def fail():
+            raise ValueError('cannot write')
+        self.queues.submit([('a', fail), ('b', lambda: writes.append('b'))])
+        self.assertRaises(ValueError, self.queues.close)
+        self.assertEqual(writes, [])
+
+    def testFailsOnWriteInterrupted(self):
+        class Interrupt(BaseException):
+            pass
+
+        def interrupt():
+            raise Interrupt()
+        self.queues.submit([('a', interrupt)])
+        self.assertRaises(Interrupt, self.queues.close)
+
+
+class TracTicketSourceTest(unittest.TestCase):
+    def setUp(self):
+        self.ticketSource = tratihubis._TracTicketSource(os.path.join('test', 'trac_tickets.csv'))
+
+    def testCanIndexTickets(self):
+        self.assertEqual(len(self.ticketSource), 3)
+        self.assertEqual(list(self.ticketSource.ticketIds()), [1, 2, 3])
+
+    def testCanReadTickets(self):
+        ticketMaps = list(self.ticketSource)
+        self.assertEqual([ticketMap['id'] for ticketMap in ticketMaps], [1, 2, 3])
+        self.assertEqual(ticketMaps[1]['description'],
+                u'A defect that is so complex that it needs multiple lines to describe.\n\nHere is another line.')
+
+    def testCanReadSingleTicket(self):
+        self.assertEqual(self.ticketSource.ticketMapFor(3)['summary'], u'_Test enhancement')
+        self.assertRaises(KeyError, self.ticketSource.ticketMapFor, 4)
+
+    def testCanReadSingleUnsortedTicket(self):
+        tempFolder = tempfile.mkdtemp(prefix='tratihubis_test_')
+        self.addCleanup(shutil.rmtree, tempFolder)
+        ticketsCsvPath = os.path.join(tempFolder, 'tickets.csv')
+        with open(os.path.join('test', 'trac_tickets.csv'), 'rb') as ticketsCsvFile:
+            ticketRows = list(csv.reader(ticketsCsvFile))
+        with open(ticketsCsvPath, 'wb') as ticketsCsvFile:
+            csv.writer(ticketsCsvFile).writerows(reversed(ticketRows))
+        ticketSource = tratihubis._TracTicketSource(ticketsCsvPath)
+        self.assertFalse(ticketSource.isSorted)
+        self.assertEqual(ticketSource.ticketMapFor(3)['summary'], u'_Test enhancement')
+        self.assertEqual(ticketSource.ticketMapFor(1)['summary'], u'_Test defect with single line')
+        self.assertRaises(KeyError, ticketSource.ticketMapFor, 4)
+
+    def testCanAccessTicketFields(self):
+        ticket = self.ticketSource.ticketMapFor(1)
+        self.assertEqual(ticket['reporter'], ticket.reporter)
+        self.assertEqual(ticket['createdtime'], 1335902400)
+        self.assertRaises(KeyError, ticket.__getitem__, 'no_such_field')
+        self.assertRaises(AttributeError, setattr, ticket, 'no_such_field', 1)
+
+    def testCanPickleTickets(self):
+        ticket = self.ticketSource.ticketMapFor(2)
+        self.assertEqual(pickle.loads(pickle.dumps(ticket, pickle.HIGHEST_PROTOCOL)), ticket)
+        self.assertEqual(pickle.loads(pickle.dumps(ticket)), ticket)
+
+    def testCanFindMilestoneTitles(self):
+        self.assertEqual(self.ticketSource.milestoneTitles(), [u'0.5.0', u'1'])
+        self.assertEqual(self.ticketSource.milestoneTitles(lambda ticketId: ticketId != 1), [u'1', u'0.5.0'])
+
+    def testCanFindDistinctUsers(self):
+        self.assertEqual(self.ticketSource.distinctValues('reporter'), [u'roskakori'])
+        self.assertEqual(self.ticketSource.distinctValues('owner'), [u'johndoe', u'roskakori'])
+        self.assertEqual(self.ticketSource.distinctValues('owner', lambda ticketId: ticketId != 1), [u'roskakori'])
+
+    def testFailsOnBrokenTicketsCsv(self):
+        self.assertRaises(tratihubis._CsvDataError, tratihubis._TracTicketSource,
+                os.path.join('test', 'test_tickets.csv'))
+
+
+class TracCommentSourceTest(unittest.TestCase):
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp(prefix='tratihubis_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempFolder)
+
+    def _commentsCsvPath(self, rows):
+        result = os.path.join(self.tempFolder, 'comments.csv')
+        with open(result, 'wb') as commentsCsvFile:
+            csv.writer(commentsCsvFile).writerows(rows)
+        return result
+
+    def _assertCanReadComments(self, commentSource):
+        try:
+            self.assertEqual([comment['author'] for comment in commentSource.commentsFor(1)],
+                    [u'crashfest', u'roskakori'])
+            self.assertEqual(commentSource.commentsFor(2), [])
+            self.assertEqual([comment['body'] for comment in commentSource.commentsFor(3)],
+                    [u'This feature would be nice.'])
+            self.assertEqual(commentSource.commentsFor(4), [])
+        finally:
+            commentSource.close()
+
+    def testCanStreamSortedComments(self):
+        commentSource = tratihubis._TracCommentSource(os.path.join('test', 'trac_comments.csv'))
+        self.assertTrue(commentSource.isStreaming)
+        self.assertEqual(commentSource.authors(), [u'crashfest', u'fanboy', u'roskakori'])
+        self.assertEqual(commentSource.authors(lambda ticketId: ticketId >= 2), [u'fanboy'])
+        self._assertCanReadComments(commentSource)
+
+    def testCanIndexUnsortedComments(self):
+        commentsCsvPath = self._commentsCsvPath([
+            ['3', '1335910600', 'fanboy', 'This feature would be nice.'],
+            ['1', '1335903400', 'crashfest', 'This does not work!'],
+            ['1', '1335904400', 'roskakori', 'Fixed in version 1.2.3.'],
+        ])
+        commentSource = tratihubis._TracCommentSource(commentsCsvPath)
+        self.assertFalse(commentSource.isStreaming)
+        self._assertCanReadComments(commentSource)
+
+    def testCanIndexCommentsOfUnsortedTickets(self):
+        commentSource = tratihubis._TracCommentSource(os.path.join('test', 'trac_comments.csv'), False)
+        self.assertFalse(commentSource.isStreaming)
+        self.assertEqual(len(commentSource.commentsFor(3)), 1)
+        self._assertCanReadComments(commentSource)
+
+    def testCanSkipCommentsOfSkippedTickets(self):
+        commentSource = tratihubis._TracCommentSource(os.path.join('test', 'trac_comments.csv'))
+        try:
+            self.assertEqual(len(commentSource.commentsFor(3)), 1)
+        finally:
+            commentSource.close()
+
+    def testCanReadWithoutComments(self):
+        commentSource = tratihubis._TracCommentSource(None)
+        self.assertEqual(commentSource.commentsFor(1), [])
+        commentSource.close()
+
+    def testCanReadCommentsInOtherEncoding(self):
+        commentsCsvPath = self._commentsCsvPath([
+            ['1', '1335903400', 'crashfest', u'caf\xe9, "na\xefve"'.encode('cp1252')],
+        ])
+        commentSource = tratihubis._TracCommentSource(commentsCsvPath, encoding='cp1252')
+        try:
+            self.assertEqual(commentSource.commentsFor(1)[0]['body'], u'caf\xe9, "na\xefve"')
+        finally:
+            commentSource.close()
+
+    def testCanDetectAsciiCompatibleEncodings(self):
+        self.assertTrue(tratihubis._isAsciiCompatible('utf-8'))
+        self.assertTrue(tratihubis._isAsciiCompatible('cp1252'))
+        self.assertFalse(tratihubis._isAsciiCompatible('utf-16'))
+        self.assertTrue(tratihubis._isAsciiCompatible('shift_jis'))
+        self.assertFalse(tratihubis._isAsciiCompatible('iso2022_jp'))
+        self.assertFalse(tratihubis._isAsciiCompatible('hz'))
+        self.assertFalse(tratihubis._isAsciiCompatible('utf-7'))
+        self.assertFalse(tratihubis._isAsciiCompatible('no-such-encoding'))
+
+    def testFailsOnBrokenCommentsCsv(self):
+        commentsCsvPath = self._commentsCsvPath([['1', '1335903400', 'crashfest']])
+        self.assertRaises(tratihubis._CsvDataError, tratihubis._TracCommentSource, commentsCsvPath)
+
+
+_Owner = collections.namedtuple('_Owner', ['login'])
+_Repo = collections.namedtuple('_Repo', ['owner', 'name'])
+
+
+class TracDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        tempFolder = tempfile.mkdtemp(prefix='tratihubis_test_')
+        self.addCleanup(shutil.rmtree, tempFolder)
+        self.ticketsCsvPath = os.path.join('test', 'trac_tickets.csv')
+        self.commentsCsvPath = os.path.join('test', 'trac_comments.csv')
+        self.attachmentsCsvPath = os.path.join('test', 'trac_attachments.csv')
+        self.milestonesCsvPath = os.path.join('test', 'trac_milestones.csv')
+        databasePath = os.path.join(tempFolder, 'trac.db')
+        benchmark_tratihubis.writeTracDatabase(databasePath, self.ticketsCsvPath, self.commentsCsvPath,
+                self.attachmentsCsvPath, self.milestonesCsvPath)
+        self.tracDatabase = tratihubis._TracDatabase(databasePath, fetchSize=2)
+        self.addCleanup(self.tracDatabase.close)
+
+    def testCanReadTickets(self):
+        ticketSource = tratihubis._TracDatabaseTicketSource(self.tracDatabase)
+        csvTicketSource = tratihubis._TracTicketSource(self.ticketsCsvPath)
+        self.assertEqual(list(ticketSource.ticketIds()), [1, 2, 3])
+        self.assertEqual(list(ticketSource), list(csvTicketSource))
+        self.assertEqual(ticketSource.ticketMapFor(2), csvTicketSource.ticketMapFor(2))
+        self.assertRaises(KeyError, ticketSource.ticketMapFor, 4)
+        self.assertEqual(ticketSource.milestoneTitles(), [u'0.5.0', u'1'])
+
+    def testCanReadComments(self):
+        commentSource = tratihubis._TracDatabaseCommentSource(self.tracDatabase)
+        csvCommentSource = tratihubis._TracCommentSource(self.commentsCsvPath)
+        for ticketId in (1, 2, 3):
+            self.assertEqual(commentSource.commentsFor(ticketId), csvCommentSource.commentsFor(ticketId))
+        self.assertEqual(commentSource.authors(), csvCommentSource.authors())
+        self.assertEqual(commentSource.authors(lambda ticketId: ticketId == 1), [u'crashfest', u'roskakori'])
+        commentSource.close()
+        csvCommentSource.close()
+
+    def testCanReadAttachmentsAndMilestones(self):
+        prefix = 'https://example.com/attachments'
+        self.assertEqual(self.tracDatabase.ticketsToAttachmentsMap(prefix),
+                tratihubis._createTicketsToAttachmentsMap(self.attachmentsCsvPath, prefix))
+        self.assertEqual(self.tracDatabase.ticketsToAttachmentsMap(None), {})
+        self.assertEqual(self.tracDatabase.milestoneMap(),
+                tratihubis._createTracMilestoneMap(self.milestonesCsvPath))
+
+    def testFailsOnBrokenDatabase(self):
+        self.assertRaises(tratihubis._ConfigError, tratihubis._TracDatabase, 'mysql://localhost/trac')
+        self.assertRaises(tratihubis._ConfigError, tratihubis._TracDatabase, 'sqlite:no_such.db')
+
+
+class TranslatorTest(unittest.TestCase):
+    def setUp(self):
+        self.translator = translator.Translator(_Repo(_Owner('roskakori'), 'tratihubis'), {12: 3},
+                trac_url='https://trac.example.com', attachmentsPrefix='https://example.com/attachments')
+
+    def testCanTranslateAttachments(self):
+        self.assertEqual(self.translator.translate(u'see [[Image(shot.png)]]', ticketId=7),
+                u'see ![shot.png](https://example.com/attachments/7/shot.png)')
+        self.assertEqual(self.translator.translate(u'see [[Image(shot.png, 50%)]]', ticketId=8),
+                u'see ![shot.png](https://example.com/attachments/8/shot.png)')
+
+    def testCanTranslateTicketLinks(self):
+        self.assertEqual(self.translator.translate(u'see ticket:12'), u'see issue #3')
+
+    def testCanCacheTranslations(self):
+        firstTranslation = self.translator.translate(u'[[Image(shot.png)]]', ticketId=7)
+        self.assertEqual(self.translator.translate(u'[[Image(shot.png)]]', ticketId=7), firstTranslation)
+        self.assertEqual(self.translator.cacheHitCount, 1)
+        self.assertNotEqual(self.translator.translate(u'[[Image(shot.png)]]', ticketId=8), firstTranslation)
+        self.assertEqual(self.translator.cacheHitCount, 1)
+
+    def testCanSkipSubstitutionsWithoutChangingTranslation(self):
+        translatorToTest = translator.Translator(_Repo(_Owner('roskakori'), 'tratihubis'),
+                dict((ticketId, ticketId) for ticketId in range(1000)), trac_url='https://trac.example.com',
+                attachmentsPrefix='https://example.com/attachments', cacheSize=0)
+        texts = []
+        for csvName, columns in [('cutplace_tickets.csv', [7, 8]), ('cutplace_comments.csv', [3])]:
+            with open(os.path.join('test', csvName), 'rb') as csvFile:
+                for row in list(csv.reader(csvFile))[1:]:
+                    texts.extend(row[column].decode('utf-8') for column in columns)
+        for ticketId, text in enumerate(texts):
+            expectedTranslation = text
+            for regex, replacement in translatorToTest.ticket_subs:
+                expectedTranslation = regex.sub(lambda match: replacement(match, ticketId), expectedTranslation)
+            for regex, replacement in translatorToTest.subs:
+                expectedTranslation = regex.sub(replacement, expectedTranslation)
+            self.assertEqual(translatorToTest.translate(text, ticketId), expectedTranslation)
+
+    def testCanFindRequiredLiteral(self):
+        self.assertEqual(translator.required_literal(r"changeset:([0-9]{1,4})"), 'changeset:')
+        self.assertEqual(translator.required_literal(r"(\s|^)r([0-9]{1,4})"), 'r')
+        self.assertEqual(translator.required_literal(r"(^|\n)[ ]{4,}"), '')
+        self.assertTrue(translator.is_anchored_at_start(r"^\s\*"))
+        self.assertFalse(translator.is_anchored_at_start(r"(^|\n)[ ]{4,}"))
+
+
+class TicketTranslatorTest(unittest.TestCase):
+    def setUp(self):
+        self.translator = translator.Translator(_Repo(_Owner('roskakori'), 'tratihubis'), {1: 11, 2: 12, 3: 13},
+                trac_url='https://trac.example.com', attachmentsPrefix='https://example.com/attachments')
+        ticketToCommentsMap = tratihubis._createTicketToCommentsMap(os.path.join('test', 'trac_comments.csv'))
+        self.ticketMapsAndComments = []
+        for ticketMap in tratihubis._TracTicketSource(os.path.join('test', 'trac_tickets.csv')):
+            ticketId = ticketMap['id']
+            if ticketId != 2:
+                comments = ticketToCommentsMap.get(ticketId, [])
+            else:
+                comments = None
+            self.ticketMapsAndComments.append((ticketMap, comments))
+
+    def _translatedTickets(self, processCount):
+        ticketTranslator = tratihubis._TicketTranslator(self.translator, processCount)
+        # Drop the duration of the translation, which differs between runs.
+        translatedTickets = ticketTranslator.translatedTickets(iter(self.ticketMapsAndComments))
+        return [(ticketMap, translatedTicket._replace(seconds=0) if translatedTicket is not None else None)
+                for ticketMap, translatedTicket in translatedTickets]
+
+    def testCanTranslateTickets(self):
+        translatedTickets = self._translatedTickets(1)
+        self.assertEqual([ticketMap['id'] for ticketMap, _ in translatedTickets], [1, 2, 3])
+        self.assertEqual(translatedTickets[1][1], None)
+        self.assertTrue('issue #11' in translatedTickets[2][1].body)
+        self.assertEqual(translatedTickets[0][1].commentAuthors, [u'crashfest', u'roskakori'])
+        self.assertTrue(translatedTickets[0][1].commentBodies[1].startswith(u'Fixed in version 1.2.3.'))
+
+    def testCanTranslateTicketsInProcesses(self):
+        self.assertEqual(self._translatedTickets(2), self._translatedTickets(1))
+
+    def testReadsOnlyFewTicketsAheadOfTranslation(self):
+        ticketMap, comments = self.ticketMapsAndComments[0]
+        readTicketCount = [0]
+
+        def ticketMapsAndComments():
+            for _ in xrange(1000):
+                readTicketCount[0] += 1
+                yield ticketMap, comments
+        ticketTranslator = tratihubis._TicketTranslator(self.translator, 2)
+        translatedTickets = ticketTranslator.translatedTickets(ticketMapsAndComments())
+        next(translatedTickets)
+        self.assertTrue(readTicketCount[0] <= 4 * tratihubis._TicketTranslator._CHUNK_SIZE, readTicketCount[0])
+        self.assertEqual(1 + sum(1 for _ in translatedTickets), 1000)
+
+
+class MigrationJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.journalPath = tempfile.mktemp(suffix='.journal')
+
+    def tearDown(self):
+        if os.path.exists(self.journalPath):
+            os.remove(self.journalPath)
+
+    def _createJournal(self, repoFullName='roskakori/tratihubis', readOnly=False):
+        return tratihubis._MigrationJournal(self.journalPath, repoFullName, readOnly)
+
+    def testCanResumeFromJournal(self):
+        journal = self._createJournal()
+        journal.record(1, tratihubis._MigrationJournal.STEP_ISSUE, issueNumber=17)
+        journal.record(1, tratihubis._MigrationJournal.STEP_COMMENT, 0)
+        journal.close()
+        journal = self._createJournal()
+        self.assertEqual(journal.issueNumberFor(1), 17)
+        self.assertEqual(journal.issueNumberFor(2), None)
+        self.assertTrue(journal.isDone(1, tratihubis._MigrationJournal.STEP_COMMENT, 0))
+        self.assertFalse(journal.isDone(1, tratihubis._MigrationJournal.STEP_COMMENT, 1))
+        self.assertFalse(journal.isDone(1, tratihubis._MigrationJournal.STEP_CLOSED))
+        journal.close()
+
+    def testCanIgnoreIncompleteLastEntry(self):
+        journal = self._createJournal()
+        journal.record(1, tratihubis._MigrationJournal.STEP_ISSUE, issueNumber=17)
+        journal.close()
+        with open(self.journalPath, 'ab') as journalFile:
+            journalFile.write('{"ticket": 2, "st')
+        journal = self._createJournal(readOnly=True)
+        self.assertEqual(journal.issueNumberFor(1), 17)
+
+    def testCanResumeStateLabelsAndSyncTime(self):
+        journal = self._createJournal()
+        journal.record(1, tratihubis._MigrationJournal.STEP_ISSUE, issueNumber=17)
+        journal.record(1, tratihubis._MigrationJournal.STEP_LABELS, value=['bug'])
+        journal.record(1, tratihubis._MigrationJournal.STEP_CLOSED)
+        journal.record(1, tratihubis._MigrationJournal.STEP_REOPENED)
+        journal.recordSync(1335988800)
+        journal.close()
+        journal = self._createJournal()
+        self.assertEqual(journal.valueFor(1, tratihubis._MigrationJournal.STEP_LABELS), ['bug'])
+        self.assertFalse(journal.isClosed(1))
+        self.assertEqual(journal.syncTime, 1335988800)
+        journal.close()
+
+    def testCanPretendWithoutJournal(self):
+        self._createJournal(readOnly=True).close()
+        self.assertFalse(os.path.exists(self.journalPath))
+
+    def testFailsOnOtherRepo(self):
+        self._createJournal().close()
+        self.assertRaises(tratihubis._ConfigError, self._createJournal, 'roskakori/cutplace')
+
+    def testCanKeepMigratedIssueNumbers(self):
+        journal = tratihubis._MigrationJournal(None, 'roskakori/tratihubis')
+        journal.record(1, tratihubis._MigrationJournal.STEP_ISSUE, issueNumber=5)
+        existingIssues = dict((number, None) for number in range(1, 6))
+        ticketsToIssuesMap = tratihubis.createTicketsToIssuesMap(
+                os.path.join('test', 'trac_tickets.csv'), existingIssues, 1, 0, journal)
+        self.assertEqual(ticketsToIssuesMap, {1: 5, 2: 6, 3: 7})
 
 
 if __name__ == "__main__":
@@ -1,21 +1,71 @@
+import collections
 import re
+import sre_constants
+import sre_parse
+import threading
+
+
+def required_literal(pattern):
+    """
+    The longest text that must be part of any match of the regular expression ``pattern``, or an empty
+    string if there is no such text. Substitutions whose required literal is not part of a text cannot
+    change this text and can be skipped.
+    """
+    result = ''
+    run = []
+    for op, av in sre_parse.parse(pattern, re.DOTALL):
+        if op == sre_constants.LITERAL:
+            run.append(chr(av) if av < 128 else unichr(av))
+        else:
+            if len(run) > len(result):
+                result = ''.join(run)
+            run = []
+    if len(run) > len(result):
+        result = ''.join(run)
+    return result
+
+
+def is_anchored_at_start(pattern):
+    """
+    True if ``pattern`` can only match at the start of a text.
+    """
+    parsed = sre_parse.parse(pattern, re.DOTALL)
+    return (len(parsed) > 0) and (parsed[0] == (sre_constants.AT, sre_constants.AT_BEGINNING))
+
 
 class Translator(object):
     """
     Simple regular expression to convert Trac wiki to Github markdown.
+
+    Substitutions that cannot match because the text lacks a literal required by their regular expression
+    are skipped, so each text is only scanned by the regular expressions that actually apply. Translations of
+    short texts are cached because many comments consist of the same boilerplate.
     """
-    def __init__(self, repo, ticketsToIssuesMap, trac_url=None, attachmentsPrefix=None):
-        self.repo_url = r'https://github.com/{login}/{name}'.format(login=repo.owner.login, name=repo.name)
+    MAX_CACHED_TEXT_LENGTH = 1024
+
+    def __init__(self, repo, ticketsToIssuesMap, trac_url=None, attachmentsPrefix=None, cacheSize=1024):
+        if repo is not None:
+            self.repo_url = r'https://github.com/{login}/{name}'.format(login=repo.owner.login, name=repo.name)
+        else:
+            # Translators in separate processes have no access to the repo.
+            self.repo_url = None
         self.trac_url = trac_url
         self.ticketsToIssuesMap = ticketsToIssuesMap
         self.subs = self.compile_subs()
         self.attachmentsPrefix = attachmentsPrefix
+        self.ticket_subs = self.compile_ticket_subs()
+        self.sub_guards = [self.guard_for(p) for p, _ in self.subs]
+        self.ticket_sub_guards = [self.guard_for(p) for p, _ in self.ticket_subs]
+        self.cacheSize = cacheSize
+        self.cacheHitCount = 0
+        self._cache = collections.OrderedDict()
+        self._cacheLock = threading.Lock()
 
     def compile_subs(self):
         subs = [
             [r"\{\{\{\s*?#!python(.*?)\}\}\}", r"```python\1```"],
-            [r"\{\{\{([^\n]*?)\}\}\}",  r"`\1`"],    
-            [r"\{\{\{(.*?)\}\}\}",  r"```\1```"],    
+            [r"\{\{\{([^\n]*?)\}\}\}",  r"`\1`"],
+            [r"\{\{\{(.*?)\}\}\}",  r"```\1```"],
             [r"====\s(.+?)\s====", r'h4. \1'],
             [r"===\s(.+?)\s===", r'h3. \1'],
             [r"==\s(.+?)\s==", r'h2. \1'],
@@ -36,7 +86,7 @@ class Translator(object):
             [r"(\b)([0-9a-f]{5,40})\.", r"\1\2"],
             [r" (\w*?)::", r"#### \1"],
             [r"\[([0-9]{1,4})\/(.+?)\]", r"[\1/\2]({trac_url}/changeset/\1/historical/\2)".format(trac_url=self.trac_url)],
-            [r'\[changeset:"(\S*?)\/fipy"\]', r"\1"],          
+            [r'\[changeset:"(\S*?)\/fipy"\]', r"\1"],
             [r'\^([0-9]{1,5})\^', r"<sup>\1</sup>"],
             [r'diff:@([0-9]{1,5}):([0-9]{1,5})', r'[diff:@\1:\2]({trac_url}/changeset?new=\2&old=\1)'.format(trac_url=self.trac_url)]
             ]
@@ -47,24 +97,67 @@ class Translator(object):
 
         return [[re.compile(r, re.DOTALL), s] for r, s in subs]
 
-    def no_compile_subs(self, ticketId):
-        print 'ticketId',ticketId
-        subs = [[r"\[\[Image\((\S*?)\,\s{0,}\S*?\)\]\]", r"![\1]({attachmentsPrefix}/{ticketId}/\1)".format(attachmentsPrefix=self.attachmentsPrefix, ticketId=ticketId)],
-                [r"\[\[Image\((\S*?)\)\]\]", r"![\1]({attachmentsPrefix}/{ticketId}/\1)".format(attachmentsPrefix=self.attachmentsPrefix, ticketId=ticketId)],
-                [r"attachment:(\S*?)", r"{attachmentsPrefix}/{ticketId}/\1".format(attachmentsPrefix=self.attachmentsPrefix, ticketId=ticketId)]]
+    def compile_ticket_subs(self):
+        """
+        Substitutions for links to attachments, which depend on the ticket ID. The replacements are
+        functions that take the match and the ticket ID so the regular expressions only have to be compiled
+        once.
+        """
+        def attachment_image(match, ticketId):
+            return u"![{name}]({attachmentsPrefix}/{ticketId}/{name})".format(
+                name=match.group(1), attachmentsPrefix=self.attachmentsPrefix, ticketId=ticketId)
 
-        return subs
-    
-    def translate(self, text, ticketId=''):
-        subs = self.no_compile_subs(ticketId)
-        for r, s in subs:
-            p = re.compile(r, re.DOTALL)
-            text = p.sub(s, text)
-        for p, s in self.subs:
-            text = p.sub(s, text)
-        
+        def attachment_link(match, ticketId):
+            return u"{attachmentsPrefix}/{ticketId}/{name}".format(
+                name=match.group(1), attachmentsPrefix=self.attachmentsPrefix, ticketId=ticketId)
+
+        subs = [[r"\[\[Image\((\S*?)\,\s{0,}\S*?\)\]\]", attachment_image],
+                [r"\[\[Image\((\S*?)\)\]\]", attachment_image],
+                [r"attachment:(\S*?)", attachment_link]]
+
+        return [[re.compile(r, re.DOTALL), s] for r, s in subs]
+
+    @staticmethod
+    def guard_for(regex):
+        """
+        Pair ``(literal, is_anchored)`` describing when a substitution using ``regex`` can change a text.
+        """
+        return required_literal(regex.pattern), is_anchored_at_start(regex.pattern)
+
+    @staticmethod
+    def apply_sub(regex, replacement, guard, text):
+        literal, is_anchored = guard
+        if literal in text:
+            if not is_anchored:
+                text = regex.sub(replacement, text)
+            elif regex.match(text) is not None:
+                text = regex.sub(replacement, text, 1)
         return text
 
+    def translate(self, text, ticketId=''):
+        isCacheable = (self.cacheSize > 0) and (len(text) <= Translator.MAX_CACHED_TEXT_LENGTH)
+        if isCacheable:
+            key = (text, ticketId)
+            with self._cacheLock:
+                result = self._cache.pop(key, None)
+                if result is not None:
+                    self._cache[key] = result
+                    self.cacheHitCount += 1
+                    return result
+
+        result = text
+        for (p, s), guard in zip(self.ticket_subs, self.ticket_sub_guards):
+            result = Translator.apply_sub(p, lambda match: s(match, ticketId), guard, result)
+        for (p, s), guard in zip(self.subs, self.sub_guards):
+            result = Translator.apply_sub(p, s, guard, result)
+
+        if isCacheable:
+            with self._cacheLock:
+                self._cache[key] = result
+                if len(self._cache) > self.cacheSize:
+                    self._cache.popitem(last=False)
+        return result
+
 class NullTranslator(Translator):
-    def translate(self, text):
+    def translate(self, text, ticketId=''):
         return text